@@ -0,0 +1,423 @@
+import atexit
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+# importing drug_system opens the stores and caches named in API.json; point
+# them at a throwaway directory first so a benchmark never touches real data
+_import_state = tempfile.mkdtemp(prefix="drugsystem-bench-")
+for _key, _name in (("PATIENT_STORE", "patients.db"), ("OPENFDA_CACHE", "openfda_cache.db"),
+                    ("SUMMARY_CACHE", "summary_cache.db"), ("LABEL_INDEX", "no_label_index.db")):
+    os.environ.setdefault(f"DRUGSYSTEM_{_key}", os.path.join(_import_state, _name))
+atexit.register(shutil.rmtree, _import_state, True)
+
+import drug_system
+import summarization
+from disk_cache import DiskCache
+from patient_store import patient_columns, open_store, CachedPatientStore
+from summarization import SUMMARIZER_BACKENDS
+
+# Replays OpenFDA label payloads from a local stub server and times the
+# add/find/list/analyze paths against synthetic registries. Payloads come from
+# fixture files written by `benchmark.py record` ("<disease>.json" holding the
+# OpenFDA response); diseases without a fixture get seeded synthetic labels,
+# so every run sees the same data. Each case runs in its own process on a copy
+# of the prepared store, so memory figures belong to that case alone.
+
+DISEASES = ["Diabetes", "Asthma", "Hypertension", "Migraine", "Epilepsy", "Depression",
+            "Arthritis", "Psoriasis", "Angina", "Insomnia"]
+MEDICATIONS = ["insulin", "metformin", "salbutamol", "lisinopril", "warfarin", "ibuprofen",
+               "sertraline", "aspirin", "none"]
+ALLERGIES = ["penicillin", "sulfa", "latex", "none"]
+CONDITIONS = ["renal failure", "pregnancy", "smoker", "liver disease", "none"]
+FIRST_NAMES = ["Ali", "Sara", "Mina", "Reza", "Nima", "Leila", "Omid", "Zahra"]
+LAST_NAMES = ["Ahmadi", "Karimi", "Sadeghi", "Rahimi", "Hosseini", "Moradi"]
+WORDS = ("patients should be monitored closely for signs of toxicity and the dose adjusted "
+         "when renal function declines or other drugs that affect clearance are added").split()
+
+
+def fixture_name(disease):
+    return "_".join(disease.lower().split()) + ".json"
+
+
+def synthetic_paragraph(rng, sentences):
+    return " ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                    for _ in range(sentences))
+
+
+def synthetic_labels(disease, count=100):
+    rng = random.Random(disease)
+    labels = []
+    for i in range(count):
+        drug = rng.choice(MEDICATIONS[:-1])
+        labels.append({
+            "id": f"{disease}-{i}",
+            "openfda": {"brand_name": [f"{drug.capitalize()} {i}"], "generic_name": [drug],
+                        "route": ["ORAL"], "rxcui": [str(100000 + i)]},
+            "indications_and_usage": [f"{drug} is indicated for {disease.lower()}."],
+            **{part.field: [synthetic_paragraph(rng, rng.randint(5, 25))]
+               for section in drug_system.SECTIONS.values() for part in section.parts if part.source == "item"},
+        })
+    return labels
+
+
+def load_fixture(fixtures, disease, count=100):
+    path = os.path.join(fixtures, fixture_name(disease)) if fixtures else None
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get("results", [])
+    return synthetic_labels(disease, count)
+
+
+class StubOpenFDA:
+    # serves /drug/label.json?search=indications_and_usage:<disease>&limit=&skip=
+    # from fixtures, with an optional fixed delay standing in for the network
+    def __init__(self, fixtures=None, latency=0.0, labels_per_disease=100):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.labels_per_disease = labels_per_disease
+        self._payloads = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                disease = query.get("search", [""])[0].split(":", 1)[-1]
+                skip = int(query.get("skip", ["0"])[0])
+                limit = int(query.get("limit", ["1"])[0])
+                results = stub.labels(disease)[skip:skip + limit]
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps({"meta": {}, "results": results} if results else
+                                  {"error": {"code": "NOT_FOUND"}}).encode("utf-8")
+                self.send_response(200 if results else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/drug/label.json"
+
+    def labels(self, disease):
+        key = " ".join(disease.split())
+        with self._lock:
+            if key not in self._payloads:
+                self._payloads[key] = load_fixture(self.fixtures, key, self.labels_per_disease)
+            return self._payloads[key]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def synthetic_registry(path, rows, seed=0):
+    rng = random.Random(seed)
+    df = pd.DataFrame({
+        "ID": range(1, rows + 1),
+        "Name": [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rows)],
+        "Age": [rng.randint(1, 95) for _ in range(rows)],
+        "Gender": [rng.choice(["Male", "Female"]) for _ in range(rows)],
+        "Weight": [rng.randint(10, 120) for _ in range(rows)],
+        "Height": [rng.randint(80, 200) for _ in range(rows)],
+        "Disease": [rng.choice(DISEASES) for _ in range(rows)],
+        "Conditions": [rng.choice(CONDITIONS) for _ in range(rows)],
+        "Allergies": [rng.choice(ALLERGIES) for _ in range(rows)],
+        "Current_Medications": [rng.choice(MEDICATIONS) for _ in range(rows)],
+    }, columns=patient_columns)
+    df.to_excel(path, index=False)
+    return path
+
+
+def rss_mb():
+    # current resident set size (Linux), to see what a loaded model costs
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    # VmHWM starts over at exec, unlike ru_maxrss, which a child process
+    # inherits from the parent that forked it
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def timed(name, func, repeat, **labels):
+    times = []
+    error = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        try:
+            func(i)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        times.append(time.perf_counter() - start)
+    result = dict(labels, op=name, n=len(times))
+    if times:
+        result.update(p50_ms=round(percentile(times, 0.5) * 1000, 3),
+                      p95_ms=round(percentile(times, 0.95) * 1000, 3),
+                      mean_ms=round(sum(times) / len(times) * 1000, 3))
+    if error:
+        result["error"] = error
+    result["rss_mb"] = rss_mb()
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result), file=sys.stderr)
+    return result
+
+
+def store_file(backend):
+    return "patients.xlsx" if backend == "xlsx" else "patients.db"
+
+
+def prepare_state(workdir, registry_xlsx, backend):
+    # the store a size's cases start from, built once
+    os.makedirs(workdir, exist_ok=True)
+    store_path = os.path.join(workdir, store_file(backend))
+    if backend == "xlsx":
+        shutil.copy(registry_xlsx, store_path)
+    else:
+        open_store(store_path).import_xlsx(registry_xlsx)
+
+
+def use_temporary_state(workdir, backend, stub_url):
+    # points the core module at a prepared store with empty caches, and at the stub
+    drug_system.store = CachedPatientStore(open_store(os.path.join(workdir, store_file(backend))))
+    drug_system.OPENFDA_URL = stub_url
+    drug_system.label_index = None
+    drug_system.fda_cache = DiskCache(os.path.join(workdir, "openfda_cache.db"))
+    summarization.use_summary_cache(DiskCache(os.path.join(workdir, "summary_cache.db")))
+
+
+def clear_caches():
+    drug_system.fda_cache.clear()
+    if summarization.summary_cache is not None:
+        summarization.summary_cache.clear()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=drug_system.base_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_ops(spec):
+    # the timed function for one case; i is the repeat number
+    ids = spec["ids"]
+    op = spec["op"]
+    if op == "load_registry":
+        return lambda i: prepare_state(os.path.join(spec["workdir"], f"load_{i}"), spec["registry"], spec["backend"])
+    if op == "find":
+        return lambda i: drug_system.find_patient_by_id(ids[i % len(ids)])
+    if op == "list":
+        return lambda i: drug_system.list_patients(i + 1, 50)
+    if op == "search":
+        return lambda i: drug_system.list_patients(1, 50, disease=DISEASES[i % len(DISEASES)], age_min=30,
+                                                   age_max=60, text="ali")
+    if op == "add":
+        return lambda i: drug_system.add_patient("Bench Patient", 40, "Female", 60, 165, "Asthma", "none",
+                                                 "none", "salbutamol")
+
+    summarizer = spec["summarizer"]
+
+    def analyze(i):
+        if not spec["warm"]:
+            clear_caches()
+        status, records = drug_system.analyze_sections(ids[i % len(ids)], [spec["option"]], spec["limit"],
+                                                       summarizer is not None, summarizer)
+        if records is None:
+            raise RuntimeError(status)
+    return analyze
+
+
+def run_case(spec):
+    # runs inside a fresh process (see run), on its own copy of the size's
+    # prepared store, so peak_rss_mb is this case's own high-water mark;
+    # setup_rss_mb is the resident size before the first timed call
+    workdir = tempfile.mkdtemp(prefix="drugsystem-case-")
+    try:
+        state = os.path.join(workdir, "state")
+        shutil.copytree(spec["template"], state)
+        use_temporary_state(state, spec["backend"], spec["stub_url"])
+        spec = dict(spec, workdir=workdir)
+        setup_rss = rss_mb()
+        result = timed(spec["op"], case_ops(spec), spec["repeat"], **spec["labels"])
+        result["setup_rss_mb"] = setup_rss
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_case_process(spec):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "case"], input=json.dumps(spec),
+                          capture_output=True, text=True, cwd=drug_system.base_dir)
+    sys.stderr.write(proc.stderr)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        error = (proc.stderr.strip().splitlines() or [f"exit status {proc.returncode}"])[-1]
+        return dict(spec["labels"], op=spec["op"], n=0, error=error)
+
+
+def run(sizes=(1000, 100000), backend="sqlite", options=None, summarizers=(None,) + SUMMARIZER_BACKENDS, repeat=20,
+        analyze_repeat=5, limit=10, fixtures=None, latency=0.0, warm=False):
+    options = options or drug_system.analysis_options
+    results = []
+    workdir = tempfile.mkdtemp(prefix="drugsystem-bench-")
+    try:
+        with StubOpenFDA(fixtures, latency, labels_per_disease=max(limit, 100)) as stub:
+            for rows in sizes:
+                registry = synthetic_registry(os.path.join(workdir, f"registry_{rows}.xlsx"), rows)
+                template = os.path.join(workdir, str(rows))
+                prepare_state(template, registry, backend)
+                labels = {"rows": rows, "backend": backend}
+                base = {"template": template, "registry": registry, "backend": backend, "stub_url": stub.url,
+                        "ids": random.Random(rows).sample(range(1, rows + 1), min(repeat, rows)),
+                        "limit": limit, "warm": warm}
+
+                results.append(run_case_process(dict(base, op="load_registry", repeat=1, labels=labels)))
+                for op in ("find", "list", "search", "add"):
+                    results.append(run_case_process(dict(base, op=op, repeat=repeat, labels=labels)))
+
+                # summarizer None runs without BART; the others are the summary backends
+                for summarizer in summarizers:
+                    for option in options:
+                        results.append(run_case_process(dict(
+                            base, op="analyze", repeat=analyze_repeat, option=option, summarizer=summarizer,
+                            labels=dict(labels, option=option, bart=summarizer is not None, summarizer=summarizer,
+                                        warm=warm))))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "sizes": list(sizes), "backend": backend,
+                 "repeat": repeat, "analyze_repeat": analyze_repeat, "limit": limit, "latency": latency,
+                 "fixtures": fixtures, "warm": warm, "process_per_case": True},
+        "results": results,
+    }
+
+
+def record(fixtures, diseases, limit):
+    # saves live OpenFDA answers as fixtures so later runs replay real labels
+    os.makedirs(fixtures, exist_ok=True)
+    for disease in diseases:
+        results = [item for page in drug_system.iter_labels(f"indications_and_usage:{disease}", limit)
+                   for item in page]
+        with open(os.path.join(fixtures, fixture_name(disease)), "w") as f:
+            json.dump({"results": results}, f)
+        print(f"{disease}: {len(results)} labels")
+
+
+def result_key(result):
+    return tuple((k, result[k]) for k in ("op", "rows", "backend", "option", "bart", "summarizer", "warm") if k in result)
+
+
+def compare(old_path, new_path):
+    # p50/p95 of every case in `new` relative to `old` (ratio < 1 is faster)
+    with open(old_path) as f:
+        old = {result_key(r): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    rows = []
+    for result in new:
+        before = old.get(result_key(result))
+        if not before or "p50_ms" not in before or "p50_ms" not in result:
+            continue
+        row = dict(result_key(result))
+        for stat in ("p50_ms", "p95_ms"):
+            if before.get(stat) and result.get(stat) is not None:
+                row[stat.replace("_ms", "_ratio")] = round(result[stat] / before[stat], 3)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark DrugSystem against replayed OpenFDA labels")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--output", default="-", help="JSON report path (default: stdout)")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    run_parser.add_argument("--backend", choices=["sqlite", "xlsx"], default="sqlite")
+    run_parser.add_argument("--options", nargs="*", choices=drug_system.analysis_options, metavar="OPTION")
+    run_parser.add_argument("--summarizers", nargs="+", choices=["none"] + list(SUMMARIZER_BACKENDS),
+                            default=["none"] + list(SUMMARIZER_BACKENDS),
+                            help="'none' runs without BART, the rest are the summary backends")
+    run_parser.add_argument("--repeat", type=int, default=20)
+    run_parser.add_argument("--analyze-repeat", type=int, default=5)
+    run_parser.add_argument("--limit", type=int, default=10, help="labels per analysis")
+    run_parser.add_argument("--fixtures", help="directory of recorded OpenFDA payloads")
+    run_parser.add_argument("--latency", type=float, default=0.0, help="stub response delay in seconds")
+    run_parser.add_argument("--warm", action="store_true", help="keep label and summary caches between runs")
+    record_parser = sub.add_parser("record", help="save live OpenFDA payloads as fixtures")
+    record_parser.add_argument("fixtures")
+    record_parser.add_argument("--diseases", nargs="+", default=DISEASES)
+    record_parser.add_argument("--limit", type=int, default=100)
+    compare_parser = sub.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    sub.add_parser("case", help="run one case described by JSON on stdin (used by run)")
+    args = parser.parse_args()
+
+    if args.command == "case":
+        print(json.dumps(run_case(json.load(sys.stdin))))
+    elif args.command == "record":
+        record(args.fixtures, args.diseases, args.limit)
+    elif args.command == "compare":
+        for row in compare(args.old, args.new):
+            print(json.dumps(row))
+    else:
+        summarizers = [None if name == "none" else name for name in args.summarizers]
+        report = run(args.sizes, args.backend, args.options, summarizers, args.repeat, args.analyze_repeat,
+                     args.limit, args.fixtures, args.latency, args.warm)
+        if args.output == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
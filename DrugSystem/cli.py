@@ -0,0 +1,209 @@
+import argparse
+import json
+import sys
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import drug_system
+import metrics
+from drug_system import (patient_columns, analysis_options, store, analyze_sections, list_patients,
+                         SUMMARIZER_BACKENDS)
+
+
+class InvalidRequest(ValueError):
+    # bad input from a client; the API answers 400 with the message
+    pass
+
+
+def frame_records(df):
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def health():
+    return {"status": "ok", "patients": store.count(), "label_index": drug_system.label_index is not None}
+
+
+def add(patient):
+    if not isinstance(patient, dict):
+        raise InvalidRequest("A patient must be a JSON object")
+    fields = {column: patient.get(column) for column in patient_columns if column != "ID"}
+    return {"ID": store.add(fields)}
+
+
+def patients_page(page=1, size=50, **filters):
+    df, total, page = list_patients(page, size, **filters)
+    return {"page": page, "size": size, "total": total, "patients": frame_records(df)}
+
+
+def _number(value, name="value"):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise InvalidRequest(f"{name} must be a number") from None
+
+
+def _integer(value, name, minimum=1):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise InvalidRequest(f"{name} must be an integer") from None
+    if number < minimum:
+        raise InvalidRequest(f"{name} must be at least {minimum}")
+    return number
+
+
+def _summarizer(backend):
+    if backend is not None and backend not in SUMMARIZER_BACKENDS:
+        raise InvalidRequest(f"Unknown summarizer {backend!r}; expected one of {', '.join(SUMMARIZER_BACKENDS)}")
+    return backend
+
+
+def _options(options):
+    unknown = [option for option in options or [] if option not in analysis_options]
+    if unknown:
+        raise InvalidRequest(f"Unknown option {unknown[0]!r}; expected one of {analysis_options}")
+    return options
+
+
+def find(patient_id):
+    patient = store.get(patient_id)
+    return frame_records(patient)[0] if not patient.empty else None
+
+
+def analyze(patient_id, options=None, limit=10, use_bart=False, summary_backend=None):
+    # naming a summarizer turns summarizing on; bart alone uses the configured default
+    use_bart = use_bart or summary_backend is not None
+    status, records = analyze_sections(patient_id, options or analysis_options, limit, use_bart, summary_backend)
+    return {"status": status, "records": records or []}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # GET /health, GET /patients?page=&size=&disease=&gender=&age_min=&age_max=&q=,
+    # GET /patients/<id>, POST /patients,
+    # GET /analyze?patient_id=..&option=..&limit=..&bart=1 or &summarizer=extractive
+    # GET /metrics (Prometheus text) or /metrics?format=json
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def _dispatch(self, handler):
+        # invalid input is a 400; anything else is logged and answered with a
+        # 500 rather than dropping the connection
+        try:
+            handler()
+        except InvalidRequest as e:
+            self._send(400, {"error": str(e)})
+        except Exception:
+            self.log_error("%s", traceback.format_exc())
+            self._send(500, {"error": "Internal server error"})
+
+    def _get(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        arg = lambda name, default=None: query.get(name, [default])[0]
+        if parts == ["health"]:
+            return self._send(200, health())
+        if parts == ["metrics"]:
+            if arg("format") == "json":
+                return self._send(200, metrics.snapshot())
+            return self._send(200, metrics.prometheus_text(), "text/plain; version=0.0.4")
+        if parts == ["patients"]:
+            return self._send(200, patients_page(_integer(arg("page", "1"), "page"), _integer(arg("size", "50"), "size"),
+                                                 disease=arg("disease"), gender=arg("gender"),
+                                                 age_min=_number(arg("age_min"), "age_min"),
+                                                 age_max=_number(arg("age_max"), "age_max"), text=arg("q")))
+        if len(parts) == 2 and parts[0] == "patients" and parts[1].isdigit():
+            patient = find(int(parts[1]))
+            return self._send(200 if patient else 404, patient or {"error": "Patient not found"})
+        if parts == ["analyze"]:
+            return self._send(200, analyze(_integer(arg("patient_id"), "patient_id", 0), _options(query.get("option")),
+                                           _integer(arg("limit", "10"), "limit"), arg("bart", "0") in ("1", "true"),
+                                           _summarizer(arg("summarizer"))))
+        self._send(404, {"error": "Not found"})
+
+    def _post(self):
+        if urlsplit(self.path).path.strip("/") != "patients":
+            return self._send(404, {"error": "Not found"})
+        length = _integer(self.headers.get("Content-Length", 0), "Content-Length", 0)
+        try:
+            patient = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": "Invalid JSON"})
+        self._send(201, add(patient))
+
+
+def serve(host="127.0.0.1", port=8000):
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    print(f"Serving DrugSystem API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DrugSystem without the Gradio UI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("health")
+    list_parser = sub.add_parser("list")
+    list_parser.add_argument("--page", type=int, default=1)
+    list_parser.add_argument("--size", type=int, default=50)
+    list_parser.add_argument("--disease")
+    list_parser.add_argument("--gender")
+    list_parser.add_argument("--age-min", type=float)
+    list_parser.add_argument("--age-max", type=float)
+    list_parser.add_argument("--search", help="text search over name, conditions and medications")
+    find_parser = sub.add_parser("find")
+    find_parser.add_argument("patient_id", type=int)
+    add_parser = sub.add_parser("add", help="add a patient given as a JSON object")
+    add_parser.add_argument("patient", help='e.g. \'{"Name": "Ali", "Age": 40, "Disease": "Asthma"}\'')
+    analyze_parser = sub.add_parser("analyze")
+    analyze_parser.add_argument("patient_id", type=int)
+    analyze_parser.add_argument("--options", nargs="*", choices=analysis_options, metavar="OPTION")
+    analyze_parser.add_argument("--limit", type=int, default=10)
+    analyze_parser.add_argument("--bart", action="store_true", help="summarize with the default backend")
+    analyze_parser.add_argument("--summarizer", choices=SUMMARIZER_BACKENDS, help="summarize with this backend")
+    serve_parser = sub.add_parser("serve", help="JSON HTTP API")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--metrics", action="store_true", help="record stage timings (see GET /metrics)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        if args.metrics:
+            metrics.enable()
+        return serve(args.host, args.port)
+    if args.command == "health":
+        result = health()
+    elif args.command == "list":
+        result = patients_page(args.page, args.size, disease=args.disease, gender=args.gender,
+                               age_min=args.age_min, age_max=args.age_max, text=args.search)
+    elif args.command == "find":
+        result = find(args.patient_id)
+    elif args.command == "add":
+        try:
+            result = add(json.loads(args.patient))
+        except ValueError as e:
+            parser.error(f"add: {e}")
+    else:
+        result = analyze(args.patient_id, args.options, args.limit, args.bart, args.summarizer)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    print()
+
+
+if __name__ == "__main__":
+    main()
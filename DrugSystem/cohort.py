@@ -0,0 +1,132 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from screening import screen_patients
+from drug_system import (store, synonyms, disease_pages, brand_names, extract_sections,
+                  SummaryBatch, SECTIONS, SCREENING_OPTION, NER_BATCH_SIZE, NER_PROCESSES, SUMMARY_BATCH_SIZE,
+                  SUMMARIZER_BACKEND, SUMMARIZER_BACKENDS)
+
+report_columns = ["Patient_ID", "Name", "Disease", "Drug", "Section", "Label", "Text"]
+
+
+def normalize_disease(disease):
+    if disease is None or (isinstance(disease, float) and disease != disease):
+        return ""
+    return " ".join(str(disease).lower().split())
+
+
+def _text(value):
+    return None if value is None or (isinstance(value, float) and value != value) else str(value)
+
+
+def fetch_disease(disease, limit):
+    try:
+        return [item for page in disease_pages(disease, limit) for item in page]
+    except ConnectionError:
+        return None
+
+
+class ReportWriter:
+    # rows go to disk one disease at a time, as JSON lines or Parquet row groups
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._file = None if self.parquet else open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        if not rows:
+            return
+        if not self.parquet:
+            for row in rows:
+                self._file.write(json.dumps(row, default=str) + "\n")
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([("Patient_ID", pa.int64())] + [(c, pa.string()) for c in report_columns[1:]])
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _screen_chunks(pool, results, names, patients, processes):
+    # the regex matching is CPU-bound, so a disease's patients are split into
+    # one chunk per process; results come back in patient order
+    if pool is None or len(patients) < 2:
+        return [lambda: screen_patients(results, names, patients, synonyms)]
+    size = -(-len(patients) // processes)
+    return [pool.submit(screen_patients, results, names, patients[i:i + size], synonyms).result
+            for i in range(0, len(patients), size)]
+
+
+def run_cohort(output, options=None, limit=10, use_bart=False, workers=4, summary_backend=None, processes=1):
+    # every distinct (normalized) disease is fetched, NER'd, summarized and
+    # screened once; diseases are fetched concurrently on the thread pool and
+    # with processes > 1 screening runs on a process pool while sections are
+    # extracted
+    options = options or list(SECTIONS) + [SCREENING_OPTION]
+    screen = SCREENING_OPTION in options
+    sections = [option for option in options if option != SCREENING_OPTION]
+
+    patients = store.load()
+    patients = patients.assign(_disease=patients["Disease"].map(normalize_disease))
+    groups = {disease: group for disease, group in patients.groupby("_disease") if disease}
+
+    writer = ReportWriter(output)
+    summary = {"patients": 0, "diseases": len(groups), "failed": []}
+    screen_pool = ProcessPoolExecutor(processes) if screen and processes > 1 else None
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            fetched = {disease: pool.submit(fetch_disease, disease, limit) for disease in groups}
+            for disease, group in groups.items():
+                results = fetched[disease].result()
+                if results is None:
+                    summary["failed"].append(disease)
+                    continue
+                names = brand_names(results, batch_size=NER_BATCH_SIZE, n_process=NER_PROCESSES)
+                rows_by_patient = [row for _, row in group.iterrows()]
+                if screen:
+                    chunks = _screen_chunks(screen_pool, results, names,
+                                            [row.to_dict() for row in rows_by_patient], processes)
+                shared = extract_sections(results, names, sections, use_bart,
+                                          SummaryBatch(SUMMARY_BATCH_SIZE, summary_backend or SUMMARIZER_BACKEND))
+                if screen:
+                    screened = [records for chunk in chunks for records in chunk()]
+                else:
+                    screened = [[] for _ in rows_by_patient]
+
+                rows = []
+                for patient, own in zip(rows_by_patient, screened):
+                    info = {"Patient_ID": int(patient["ID"]), "Name": _text(patient["Name"]), "Disease": _text(patient["Disease"])}
+                    rows.extend(dict(info, **record) for record in shared + own)
+                writer.write(rows)
+                summary["patients"] += len(rows_by_patient)
+    finally:
+        writer.close()
+        if screen_pool is not None:
+            screen_pool.shutdown(cancel_futures=True)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze every patient in the registry, one query per disease")
+    parser.add_argument("output", help="report path, .jsonl or .parquet")
+    parser.add_argument("--options", nargs="*", help="sections to include (default: all)")
+    parser.add_argument("--limit", type=int, default=10, help="labels per disease")
+    parser.add_argument("--bart", action="store_true", help="summarize with the default backend")
+    parser.add_argument("--summarizer", choices=SUMMARIZER_BACKENDS, help="summarize with this backend")
+    parser.add_argument("--workers", type=int, default=4, help="threads fetching diseases")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="processes screening patients")
+    args = parser.parse_args()
+
+    print(json.dumps(run_cohort(args.output, args.options, args.limit, args.bart or args.summarizer is not None,
+                                args.workers, args.summarizer, args.processes)))
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    # JSON values in a SQLite file, expired after `ttl` seconds and evicted
+    # least-recently-used first once the stored size goes over `max_bytes`
+    def __init__(self, path, ttl=None, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB,
+                    size INTEGER,
+                    created REAL,
+                    accessed REAL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)")
+
+    def get(self, key):
+        key = key if isinstance(key, str) else make_key(*key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value):
+        key = key if isinstance(key, str) else make_key(*key)
+        blob = zlib.compress(json.dumps(value).encode("utf-8"), 1)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                               (key, blob, len(blob), now, now))
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        if self.ttl:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                total -= size
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# the HW5 dose rules: adults (18+) are safe between 0.1 and 0.5 mg/kg, younger
+# patients between 0.05 and 0.3 mg/kg; doses that are not a positive number
+# are invalid; a patient is high risk with 2+ unsafe doses or an average valid
+# dose above the safe maximum
+ADULT_AGE = 18
+ADULT_RANGE = (0.1, 0.5)
+CHILD_RANGE = (0.05, 0.3)
+HIGH_RISK_UNSAFE = 2
+
+# a dosing log has one row per dose: Patient_ID, Time, Dose (mg)
+log_columns = ["Patient_ID", "Time", "Dose"]
+STATUSES = pd.CategoricalDtype(["invalid", "safe", "unsafe", "unknown patient"])
+_counts = ["Invalid", "Safe", "Unsafe", "Unknown"]
+
+
+def safe_range(age, weight):
+    age = np.asarray(age, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    adult = age >= ADULT_AGE
+    # a missing age leaves the range undefined (NaN) like a missing weight does
+    weight = np.where(np.isnan(age), np.nan, weight)
+    low = np.where(adult, ADULT_RANGE[0], CHILD_RANGE[0]) * weight
+    high = np.where(adult, ADULT_RANGE[1], CHILD_RANGE[1]) * weight
+    return low, high
+
+
+def _registry_arrays(registry):
+    # Age and Weight by ID; the trailing NaN is what unknown IDs (position -1) read
+    registry = registry.dropna(subset=["ID"]).drop_duplicates("ID", keep="last")
+    index = pd.Index(registry["ID"].astype("int64"))
+    age = np.append(pd.to_numeric(registry["Age"], errors="coerce").to_numpy(dtype=float), np.nan)
+    weight = np.append(pd.to_numeric(registry["Weight"], errors="coerce").to_numpy(dtype=float), np.nan)
+    return index, age, weight
+
+
+def _patient_ids(log):
+    return pd.to_numeric(log["Patient_ID"], errors="coerce").fillna(-1).astype("int64").to_numpy()
+
+
+def _status_codes(ids, doses, lookup):
+    # 0 invalid, 1 safe, 2 unsafe, 3 unknown patient (or no age/weight)
+    index, age, weight = lookup
+    pos = index.get_indexer(ids)
+    low, high = safe_range(age[pos], weight[pos])
+    dose = pd.to_numeric(doses, errors="coerce").to_numpy(dtype=float)
+    codes = np.where(dose > 0, np.where((dose >= low) & (dose <= high), 1, 2), 0)
+    codes[np.isnan(low)] = 3
+    return codes, dose, low, high
+
+
+def classify_doses(log, registry):
+    # every dose with its patient's safe range and a status
+    codes, _, low, high = _status_codes(_patient_ids(log), log["Dose"], _registry_arrays(registry))
+    return log.assign(Min_Dose=low, Max_Dose=high, Status=pd.Categorical.from_codes(codes, dtype=STATUSES))
+
+
+def _partial_totals(log, lookup):
+    # per-patient counts and valid-dose sums for one chunk of the log
+    ids = _patient_ids(log)
+    codes, dose, _, _ = _status_codes(ids, log["Dose"], lookup)
+    checked = (codes == 1) | (codes == 2)
+    frame = pd.DataFrame({"Patient_ID": ids, "Valid_Dose_Sum": np.where(checked, dose, 0.0)})
+    for code, name in enumerate(_counts):
+        frame[name] = (codes == code).astype("int64")
+    return frame.groupby("Patient_ID", sort=False).sum()
+
+
+def summarize_totals(totals, registry):
+    # turns summed counts into the per-patient report
+    totals = totals.groupby(level=0).sum()
+    patients = registry.dropna(subset=["ID"]).drop_duplicates("ID", keep="last")
+    patients = patients.assign(ID=patients["ID"].astype("int64")).set_index("ID")
+    report = totals.join(patients[["Name", "Age", "Weight"]], how="left")
+    report["Min_Dose"], report["Max_Dose"] = safe_range(pd.to_numeric(report["Age"], errors="coerce"),
+                                                         pd.to_numeric(report["Weight"], errors="coerce"))
+    report["Records"] = report[_counts].sum(axis=1)
+    report["Valid"] = report["Safe"] + report["Unsafe"]
+    valid = report["Valid"].to_numpy()
+    report["Avg_Dose"] = np.divide(report["Valid_Dose_Sum"], valid, out=np.zeros(len(report)), where=valid > 0)
+    report["Safe_Pct"] = np.divide(100 * report["Safe"], valid, out=np.zeros(len(report)), where=valid > 0)
+    report["High_Risk"] = ((report["Unsafe"] >= HIGH_RISK_UNSAFE) |
+                           ((valid > 0) & (report["Avg_Dose"] > report["Max_Dose"])))
+    report.loc[report["Unknown"] > 0, "High_Risk"] = False
+    report = report.reset_index().rename(columns={"index": "Patient_ID"})
+    return report[["Patient_ID", "Name", "Age", "Weight", "Min_Dose", "Max_Dose", "Records", "Invalid",
+                   "Valid", "Safe", "Unsafe", "Unknown", "Avg_Dose", "Safe_Pct", "High_Risk"]]
+
+
+def check_doses(log, registry):
+    # per-patient valid/unsafe counts, average dose and high-risk flag
+    return summarize_totals(_partial_totals(log, _registry_arrays(registry)), registry)
+
+
+def iter_log_chunks(path, chunksize=1_000_000):
+    # CSV is read chunksize rows at a time, Parquet one batch at a time
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=log_columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(path, usecols=log_columns, chunksize=chunksize)
+
+
+def check_dose_log(chunks, registry):
+    # streams a log too large for memory; only the per-patient totals are kept
+    lookup = _registry_arrays(registry)
+    totals = [_partial_totals(chunk, lookup) for chunk in chunks]
+    if not totals:
+        totals = [pd.DataFrame(columns=["Valid_Dose_Sum"] + _counts, dtype="int64")]
+    return summarize_totals(pd.concat(totals), registry)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from patient_store import open_store
+
+    parser = argparse.ArgumentParser(description="Check a dosing log against each patient's safe mg/kg range")
+    parser.add_argument("log", help="dosing log (.csv or .parquet) with Patient_ID, Time and Dose columns")
+    parser.add_argument("--registry", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "patients.db"),
+                        help="patient store (.db or .xlsx)")
+    parser.add_argument("--output", help="per-patient report (.csv or .parquet); printed if omitted")
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    parser.add_argument("--high-risk", action="store_true", help="only report high-risk patients")
+    args = parser.parse_args()
+
+    report = check_dose_log(iter_log_chunks(args.log, args.chunksize), open_store(args.registry).load())
+    if args.high_risk:
+        report = report[report["High_Risk"]]
+    if args.output and args.output.endswith(".parquet"):
+        report.to_parquet(args.output, index=False)
+    elif args.output:
+        report.to_csv(args.output, index=False)
+    else:
+        print(report.to_string(index=False))
@@ -0,0 +1,222 @@
+import pandas as pd
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from patient_store import patient_columns, open_store, CachedPatientStore
+from disk_cache import DiskCache
+from http_client import HttpClient
+from label_index import LabelIndex
+from ner import brand_names
+from summarization import SummaryBatch, SUMMARIZER_BACKENDS, use_summary_cache, set_threads
+from sections import SECTIONS, record_columns, extract_sections, format_records
+from screening import SCREENING_OPTION, load_synonyms, screen_results
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(base_dir, "API.json")) as f:
+    config = json.load(f)
+
+def config_path(key, default=None):
+    # relative paths in API.json are relative to this folder, not the caller's cwd;
+    # DRUGSYSTEM_<KEY> in the environment overrides the file (benchmarks and
+    # tests point the stores and caches at throwaway paths this way)
+    value = os.environ.get(f"DRUGSYSTEM_{key}") or config.get(key, default)
+    return os.path.join(base_dir, value) if value else None
+
+OPENFDA_URL = config["OPENFDA_URL"]
+fda_cache = DiskCache(config_path("OPENFDA_CACHE", "openfda_cache.db"),
+                      ttl=config.get("OPENFDA_CACHE_TTL", 24 * 3600),
+                      max_bytes=config.get("OPENFDA_CACHE_MAX_MB", 256) * 1024 * 1024)
+http = HttpClient(timeout=config.get("HTTP_TIMEOUT", 30),
+                  retries=config.get("HTTP_RETRIES", 4),
+                  max_per_host=config.get("HTTP_MAX_PER_HOST", 4))
+# with a local index built by label_index.py, disease searches never hit the network
+label_index_path = config_path("LABEL_INDEX")
+label_index = LabelIndex(label_index_path) if label_index_path and os.path.exists(label_index_path) else None
+OPENFDA_PAGE_SIZE = config.get("OPENFDA_PAGE_SIZE", 50)
+OPENFDA_PAGE_WORKERS = config.get("OPENFDA_PAGE_WORKERS", 4)
+NER_BATCH_SIZE = config.get("NER_BATCH_SIZE", 32)
+NER_PROCESSES = config.get("NER_PROCESSES", 1)
+SUMMARY_BATCH_SIZE = config.get("SUMMARY_BATCH_SIZE", 8)
+SUMMARIZER_BACKEND = config.get("SUMMARIZER_BACKEND", "distilbart")
+set_threads(config.get("SUMMARIZER_THREADS", 0))
+synonyms = load_synonyms(config_path("SYNONYMS"))
+analysis_options = list(SECTIONS) + [SCREENING_OPTION]
+metrics.enable(config.get("METRICS", False))
+use_summary_cache(DiskCache(config_path("SUMMARY_CACHE", "summary_cache.db"),
+                            max_bytes=config.get("SUMMARY_CACHE_MAX_MB", 64) * 1024 * 1024))
+
+excel_file = os.path.join(base_dir, "patients.xlsx")
+store = CachedPatientStore(open_store(config_path("PATIENT_STORE", "patients.db")))
+if store.store.count() == 0 and os.path.exists(excel_file) and store.path != excel_file:
+    store.import_xlsx(excel_file)
+
+def load_patients():
+    with metrics.span("load_patients"):
+        return store.load()
+
+def add_patient(name, age, gender, weight, height, disease, conditions, allergies, current_medications):
+    new_patient = {
+        "Name": name,
+        "Age": age,
+        "Gender": gender,
+        "Weight": weight,
+        "Height": height,
+        "Disease": disease,
+        "Conditions": conditions,
+        "Allergies": allergies,
+        "Current_Medications": current_medications
+    }
+    new_id = store.add(new_patient)
+    return f"Patient added with ID {new_id}"
+
+def find_patient_by_id(patient_id):
+    patient = store.get(patient_id)
+    if patient.empty:
+        return "Patient not found", pd.DataFrame()
+    return f"Patient ID {patient_id}", patient
+
+def show_all_patients():
+    return store.load()
+
+def list_patients(page=1, size=50, disease=None, gender=None, age_min=None, age_max=None, text=None):
+    size = max(int(size or 50), 1)
+    page = max(int(page or 1), 1)
+    df, total = store.query(page, size, disease=disease or None, gender=gender or None,
+                            age_min=age_min, age_max=age_max, text=text or None)
+    last_page = max((total + size - 1) // size, 1)
+    if page > last_page:
+        page = last_page
+        df, total = store.query(page, size, disease=disease or None, gender=gender or None,
+                                age_min=age_min, age_max=age_max, text=text or None)
+    return df, total, page
+
+def patient_diseases():
+    return store.diseases()
+
+def fetch_labels(search, limit, skip=0):
+    limit = int(limit) if limit else 1
+    key = (" ".join(search.lower().split()), limit, int(skip))
+    results = fda_cache.get(key)
+    if results is not None:
+        metrics.count("openfda_cache_hits")
+        return results
+    metrics.count("openfda_cache_misses")
+    try:
+        with metrics.span("openfda_request"):
+            response = http.get(OPENFDA_URL, params={"search": search, "limit": limit, "skip": skip})
+    except OSError:
+        metrics.count("openfda_errors")
+        return None
+    metrics.count("openfda_requests")
+    metrics.count("openfda_bytes", len(response.content))
+    if response.status_code == 404:
+        # OpenFDA answers 404 when nothing matches the search
+        results = []
+    elif response.status_code != 200:
+        metrics.count("openfda_errors")
+        return None
+    else:
+        results = response.json().get('results', [])
+    fda_cache.set(key, results)
+    return results
+
+def iter_labels(search, limit):
+    # the first page is fetched alone so results can be shown right away;
+    # the rest are fetched concurrently and yielded in order
+    limit = int(limit) if limit else 1
+    page_size = min(limit, OPENFDA_PAGE_SIZE)
+    first = fetch_labels(search, page_size)
+    if first is None:
+        raise ConnectionError("Failed to fetch data from OpenFDA. Check your connection.")
+    yield first
+    if len(first) < page_size:
+        return
+
+    with ThreadPoolExecutor(OPENFDA_PAGE_WORKERS) as pool:
+        futures = [pool.submit(fetch_labels, search, min(page_size, limit - skip), skip)
+                   for skip in range(page_size, limit, page_size)]
+        try:
+            for future in futures:
+                page = future.result()
+                if page is None:
+                    # a failed page must not pass for the end of the results
+                    raise ConnectionError("Failed to fetch data from OpenFDA. Check your connection.")
+                if not page:
+                    break
+                yield page
+                if len(page) < page_size:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+
+def disease_pages(disease, limit):
+    if label_index is not None:
+        return label_index.iter_pages(disease, limit, OPENFDA_PAGE_SIZE)
+    return iter_labels(f"indications_and_usage:{disease}", limit)
+
+def iter_sections(patient_id, options, limit_search, use_bart=False, summary_backend=None):
+    # with metrics enabled, each call logs one JSON line with its stage timings
+    summary_backend = summary_backend or SUMMARIZER_BACKEND
+    stages = metrics.trace()
+    start = time.perf_counter()
+    with metrics.span("load_patient", stages):
+        patient = store.get(patient_id)
+    if patient.empty:
+        raise LookupError("Patient not found")
+
+    disease = patient.iloc[0]['Disease']
+    screen = SCREENING_OPTION in options
+    options = [option for option in options if option != SCREENING_OPTION]
+    results = records_count = 0
+    # screening waits for the last page so one synonym map covers the whole run
+    screened_labels, screened_names = [], []
+    status = "incomplete"
+    pages = iter(disease_pages(disease, limit_search))
+    try:
+        while True:
+            with metrics.span("fetch", stages):
+                page = next(pages, None)
+            if page is None:
+                break
+            with metrics.span("ner", stages):
+                names = brand_names(page, batch_size=NER_BATCH_SIZE, n_process=NER_PROCESSES)
+            with metrics.span("sections", stages):
+                records = extract_sections(page, names, options, use_bart,
+                                           SummaryBatch(SUMMARY_BATCH_SIZE, summary_backend))
+            if screen:
+                screened_labels += page
+                screened_names += names
+            results += len(page)
+            records_count += len(records)
+            metrics.count("results_processed", len(page))
+            yield records
+        if screened_labels:
+            with metrics.span("screening", stages):
+                records = screen_results(screened_labels, screened_names, patient.iloc[0], synonyms)
+            records_count += len(records)
+            yield records
+        status = "ok"
+    finally:
+        # timings, counts and status only: no patient identifiers or diagnoses
+        metrics.log_request("analyze", stages, status=status, options=len(options) + screen, use_bart=bool(use_bart),
+                            summary_backend=summary_backend if use_bart else None, results=results,
+                            records=records_count, seconds=round(time.perf_counter() - start, 6))
+
+def analyze_sections(patient_id, options, limit_search, use_bart=False, summary_backend=None):
+    try:
+        records = [record for page in iter_sections(patient_id, options, limit_search, use_bart, summary_backend)
+                   for record in page]
+    except (LookupError, ConnectionError) as e:
+        return str(e), None
+    return f"{len(records)} entries found", records
+
+def analyze_patient(patient_id, option, limit_search, use_bart=False, summary_backend=None):
+    status, records = analyze_sections(patient_id, [option], limit_search, use_bart, summary_backend)
+    if records is None:
+        return status
+    return format_records(records) if records else "No information found for selected option"
@@ -0,0 +1,59 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    # one pooled session for the whole app: keep-alive connections, at most
+    # `max_per_host` requests in flight per host, and exponential backoff
+    # with jitter on connection errors, 429 and 5xx
+    def __init__(self, timeout=(5, 30), retries=4, backoff=0.5, max_backoff=30, max_per_host=4):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_per_host = max_per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._hosts[host]
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, params=None):
+        slot = self._host_slot(url)
+        for attempt in range(self.retries + 1):
+            with slot:
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+                    response = None
+            if response is not None and (response.status_code not in RETRY_STATUS or attempt == self.retries):
+                return response
+            if response is not None:
+                response.close()
+            time.sleep(self._delay(attempt, response))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,215 @@
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import zipfile
+import zlib
+
+DOWNLOAD_MANIFEST = "https://api.fda.gov/download.json"
+
+# everything analyze_patient reads from a label, see sections.SECTIONS
+LABEL_FIELDS = [
+    "id", "set_id", "effective_time", "openfda", "indications_and_usage",
+    "drug_interactions", "pregnancy", "nursing_mothers", "use_in_specific_populations",
+    "boxed_warning", "precautions", "warnings", "warnings_and_cautions",
+    "dosage_forms_and_strengths", "dosage_and_administration", "adverse_reactions",
+    "clinical_studies", "contraindications", "geriatric_use", "pharmacodynamics",
+    "pharmacokinetics", "description", "nonclinical_toxicology", "mechanism_of_action",
+    "teratogenic_effects", "overdosage", "carcinogenesis_and_mutagenesis_and_impairment_of_fertility",
+    "risks", "clinical_pharmacology",
+]
+
+_results_start = re.compile(r'"results"\s*:\s*\[')
+_separator = re.compile(r'[\s,]*')
+
+
+def iter_label_records(stream, chunk_size=1 << 20):
+    # walks the top-level "results" array of a bulk label file one record at a
+    # time, so memory stays at one chunk plus one record whatever the file size
+    decoder = json.JSONDecoder()
+    buf = ""
+    while True:
+        match = _results_start.search(buf)
+        if match:
+            pos = match.end()
+            break
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        buf = buf[-32:] + chunk
+
+    while True:
+        pos = _separator.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+        pos = end
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+
+def _open_text(path):
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if name.endswith(".json"))
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _text(value):
+    return " ".join(map(str, value)) if isinstance(value, list) else str(value or "")
+
+
+def _fts_phrase(text):
+    return '"' + " ".join(text.split()).replace('"', '""') + '"'
+
+
+class LabelIndex:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS labels (
+                    id INTEGER PRIMARY KEY,
+                    set_id TEXT UNIQUE,
+                    effective_time TEXT,
+                    indications TEXT,
+                    doc BLOB
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS labels_fts USING fts5(
+                    indications, content='labels', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS labels_ai AFTER INSERT ON labels BEGIN
+                    INSERT INTO labels_fts(rowid, indications) VALUES (new.id, new.indications);
+                END;
+                CREATE TRIGGER IF NOT EXISTS labels_ad AFTER DELETE ON labels BEGIN
+                    INSERT INTO labels_fts(labels_fts, rowid, indications) VALUES ('delete', old.id, old.indications);
+                END;
+                CREATE TABLE IF NOT EXISTS ingested (
+                    source TEXT PRIMARY KEY,
+                    signature TEXT,
+                    records INTEGER
+                );
+            """)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    def is_ingested(self, source, signature):
+        row = self.conn.execute("SELECT signature FROM ingested WHERE source = ?", (source,)).fetchone()
+        return row is not None and row[0] == signature
+
+    def add(self, record):
+        set_id = record.get("set_id") or record.get("id")
+        effective_time = str(record.get("effective_time", ""))
+        existing = self.conn.execute("SELECT id, effective_time FROM labels WHERE set_id = ?", (set_id,)).fetchone()
+        if existing is not None:
+            if existing[1] > effective_time:
+                return False
+            self.conn.execute("DELETE FROM labels WHERE id = ?", (existing[0],))
+        doc = {field: record[field] for field in LABEL_FIELDS if field in record}
+        self.conn.execute(
+            "INSERT INTO labels (set_id, effective_time, indications, doc) VALUES (?, ?, ?, ?)",
+            (set_id, effective_time, _text(record.get("indications_and_usage")),
+             zlib.compress(json.dumps(doc).encode("utf-8"))))
+        return True
+
+    def ingest(self, path, source=None, signature=None, commit_every=500):
+        source = source or os.path.basename(path)
+        if signature is None:
+            st = os.stat(path)
+            signature = f"{st.st_size}:{st.st_mtime_ns}"
+        if self.is_ingested(source, signature):
+            return 0
+
+        count = 0
+        with _open_text(path) as stream:
+            for record in iter_label_records(stream):
+                self.add(record)
+                count += 1
+                if count % commit_every == 0:
+                    self.conn.commit()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO ingested VALUES (?, ?, ?)", (source, signature, count))
+        return count
+
+    def ingest_download(self, http, manifest_url=DOWNLOAD_MANIFEST):
+        # pulls every drug/label partition listed in the openFDA manifest,
+        # skipping partitions already ingested for the same export date
+        manifest = http.get(manifest_url).json()["results"]["drug"]["label"]
+        total = 0
+        for partition in manifest["partitions"]:
+            url = partition["file"]
+            signature = f"{manifest['export_date']}:{partition.get('records')}"
+            if self.is_ingested(url, signature):
+                continue
+            with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp:
+                response = http.session.get(url, stream=True, timeout=http.timeout)
+                response.raise_for_status()
+                for chunk in response.iter_content(1 << 20):
+                    tmp.write(chunk)
+            try:
+                total += self.ingest(tmp.name, source=url, signature=signature)
+            finally:
+                os.remove(tmp.name)
+        return total
+
+    def search(self, disease, limit, skip=0):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT labels.doc FROM labels_fts JOIN labels ON labels.id = labels_fts.rowid "
+                "WHERE labels_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                (_fts_phrase(disease), int(limit), int(skip))).fetchall()
+        return [json.loads(zlib.decompress(row[0])) for row in rows]
+
+    def iter_pages(self, disease, limit, page_size):
+        limit = int(limit) if limit else 1
+        for skip in range(0, limit, page_size):
+            page = self.search(disease, min(page_size, limit - skip), skip)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the local openFDA drug label index")
+    parser.add_argument("index", help="index database, e.g. labels.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="add bulk drug-label files (.json or .json.zip)")
+    ingest.add_argument("files", nargs="*")
+    ingest.add_argument("--download", action="store_true", help="fetch every partition from the openFDA download manifest")
+    search = sub.add_parser("search", help="look up labels by disease")
+    search.add_argument("disease")
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    index = LabelIndex(args.index)
+    if args.command == "ingest":
+        for path in args.files:
+            print(f"{path}: {index.ingest(path)} labels")
+        if args.download:
+            from http_client import HttpClient
+            print(f"download: {index.ingest_download(HttpClient())} labels")
+        print(f"{index.count()} labels in {args.index}")
+    else:
+        for label in index.search(args.disease, args.limit):
+            brand_name = label.get("openfda", {}).get("brand_name", ["?"])
+            print(brand_name[0] if isinstance(brand_name, list) else brand_name)
@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+import time
+
+# latency histograms (seconds) and counters for the analysis stages; while
+# disabled span() hands out a shared no-op object and count() returns at once
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+enabled = False
+logger = logging.getLogger("drugsystem.metrics")
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+
+
+def enable(on=True, log=True):
+    # log=True writes one JSON line per analysis request to the
+    # "drugsystem.metrics" logger (stderr unless configured otherwise)
+    global enabled
+    enabled = bool(on)
+    if enabled and log and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def observe(name, seconds):
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+        stats["count"] += 1
+        stats["sum"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats["buckets"][i] += 1
+                break
+
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+class Span:
+    # times a `with` block into the stage histogram and, if given a trace
+    # dict, adds the seconds to trace[name] for the per-request log line
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name, trace=None):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        observe(self.name, elapsed)
+        if self.trace is not None:
+            self.trace[self.name] = self.trace.get(self.name, 0.0) + elapsed
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name, trace=None):
+    return Span(name, trace) if enabled else _null_span
+
+
+def trace():
+    # per-request stage timings, or None while metrics are off
+    return {} if enabled else None
+
+
+def log_request(kind, stages, **fields):
+    # fields are operational (counts, flags, durations); never pass patient data
+    if not enabled or stages is None:
+        return
+    fields["stages"] = {name: round(seconds, 6) for name, seconds in stages.items()}
+    logger.info(json.dumps(dict({"request": kind}, **fields), default=str))
+
+
+def snapshot():
+    with _lock:
+        timings = {name: {"count": s["count"], "sum": s["sum"], "max": s["max"]} for name, s in _timings.items()}
+        return {"enabled": enabled, "timings": timings, "counters": dict(_counters)}
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def prometheus_text():
+    with _lock:
+        lines = ["# HELP drugsystem_stage_seconds Time spent in each analysis stage.",
+                 "# TYPE drugsystem_stage_seconds histogram"]
+        for name, stats in sorted(_timings.items()):
+            cumulative = 0
+            for bound, hits in zip(BUCKETS, stats["buckets"]):
+                cumulative += hits
+                lines.append(f'drugsystem_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'drugsystem_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'drugsystem_stage_seconds_sum{{stage="{name}"}} {stats["sum"]}')
+            lines.append(f'drugsystem_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        for name, value in sorted(_counters.items()):
+            lines.append(f"# TYPE drugsystem_{name}_total counter")
+            lines.append(f"drugsystem_{name}_total {value}")
+    return "\n".join(lines) + "\n"
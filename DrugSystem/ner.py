@@ -0,0 +1,51 @@
+import threading
+
+import metrics
+
+NER_MODEL = "en_ner_bc5cdr_md"
+NER_PIPES = {"tok2vec", "ner"}
+
+_nlp = None
+_lock = threading.Lock()
+
+
+def get_nlp():
+    # loaded on first use and shared by every request
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                import spacy
+                nlp = spacy.load(NER_MODEL)
+                nlp.select_pipes(disable=[name for name in nlp.pipe_names if name not in NER_PIPES])
+                _nlp = nlp
+    return _nlp
+
+
+def openfda_brand_name(item):
+    brand_name = item.get("openfda", {}).get("brand_name")
+    if isinstance(brand_name, list):
+        return brand_name[0] if brand_name else None
+    if isinstance(brand_name, str):
+        return brand_name
+    return None
+
+
+def indications_text(item):
+    indications_list = item.get("indications_and_usage", [])
+    return " ".join(indications_list) if isinstance(indications_list, list) else str(indications_list)
+
+
+def brand_names(results, batch_size=32, n_process=1):
+    names = [openfda_brand_name(item) for item in results]
+    missing = [i for i, name in enumerate(names) if name is None]
+    if not missing:
+        return names
+    metrics.count("ner_texts", len(missing))
+    metrics.count("ner_batches", -(-len(missing) // batch_size))
+    texts = (indications_text(results[i]) for i in missing)
+    with metrics.span("spacy_ner"):
+        docs = get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)
+        for i, doc in zip(missing, docs):
+            names[i] = next((ent.text for ent in doc.ents if ent.label_ == "CHEMICAL"), "unknown drug name")
+    return names
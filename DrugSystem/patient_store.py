@@ -0,0 +1,404 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+patient_columns = ["ID", "Name", "Age", "Gender", "Weight", "Height",
+                   "Disease", "Conditions", "Allergies", "Current_Medications"]
+
+
+def normalize_patient_frame(df):
+    # older sheets use "Current Medications" instead of "Current_Medications"
+    df = df.copy()
+    for col in list(df.columns):
+        name = str(col).strip().replace(" ", "_")
+        if name == col:
+            continue
+        if name in df.columns:
+            df[name] = df[name].astype(object).where(df[name].notna(), df[col])
+        else:
+            df[name] = df[col]
+        df = df.drop(columns=col)
+    return df.reindex(columns=patient_columns)
+
+
+def _fts_prefix(text):
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+
+def query_frame(df, page=1, size=50, disease=None, gender=None, age_min=None, age_max=None, text=None):
+    # in-memory counterpart of SQLitePatientStore.query for the Excel store
+    mask = pd.Series(True, index=df.index)
+    if disease:
+        mask &= df["Disease"] == disease
+    if gender:
+        mask &= df["Gender"] == gender
+    if age_min is not None:
+        mask &= df["Age"] >= age_min
+    if age_max is not None:
+        mask &= df["Age"] <= age_max
+    for word in (text or "").split():
+        found = pd.Series(False, index=df.index)
+        for column in ("Name", "Conditions", "Current_Medications"):
+            found |= df[column].astype(str).str.contains(word, case=False, regex=False)
+        mask &= found
+    matches = df[mask]
+    start = (max(int(page), 1) - 1) * int(size)
+    return matches.iloc[start:start + int(size)], len(matches)
+
+
+def _to_row(values):
+    return tuple(None if pd.isna(v) else v for v in values)
+
+
+class FileLock:
+    # exclusive lock shared by threads and by other processes using the same file
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._thread_lock.release()
+
+
+class ExcelPatientStore:
+    # writers hold a lock file and replace the workbook atomically, so IDs are
+    # never handed out twice and readers never see a half-written file
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+
+    def load(self):
+        if os.path.exists(self.path):
+            return normalize_patient_frame(pd.read_excel(self.path))
+        return pd.DataFrame(columns=patient_columns)
+
+    def save(self, df):
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(os.path.abspath(self.path)))
+        os.close(fd)
+        try:
+            df.to_excel(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def count(self):
+        return len(self.load())
+
+    def get(self, patient_id):
+        df = self.load()
+        return df[df['ID'] == patient_id]
+
+    def add(self, patient):
+        with self.lock:
+            df = self.load()
+            new_id = 1 if df.empty else int(df['ID'].max()) + 1
+            new_patient = dict(patient, ID=new_id)
+            df = pd.concat([df, pd.DataFrame([new_patient])], ignore_index=True)
+            self.save(df)
+        return new_id
+
+    def import_xlsx(self, path):
+        df = normalize_patient_frame(pd.read_excel(path))
+        with self.lock:
+            self.save(df)
+        return len(df)
+
+    def export_xlsx(self, path):
+        self.load().to_excel(path, index=False)
+
+    def query(self, page=1, size=50, **filters):
+        return query_frame(self.load(), page, size, **filters)
+
+    def diseases(self):
+        return sorted(self.load()["Disease"].dropna().unique().tolist())
+
+
+class SQLitePatientStore:
+    # WAL journaling lets readers keep reading while one writer inserts; IDs
+    # come from the INTEGER PRIMARY KEY inside the insert's write transaction
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS patients (
+                    ID INTEGER PRIMARY KEY,
+                    Name TEXT,
+                    Age NUMERIC,
+                    Gender TEXT,
+                    Weight NUMERIC,
+                    Height NUMERIC,
+                    Disease TEXT,
+                    Conditions TEXT,
+                    Allergies TEXT,
+                    Current_Medications TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_disease ON patients(Disease)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_medications ON patients(Current_Medications)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_gender_age ON patients(Gender, Age)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_age ON patients(Age)")
+            has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'").fetchone()
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+                    Name, Conditions, Current_Medications, content='patients', content_rowid='ID'
+                );
+                CREATE TRIGGER IF NOT EXISTS patients_ai AFTER INSERT ON patients BEGIN
+                    INSERT INTO patients_fts(rowid, Name, Conditions, Current_Medications)
+                    VALUES (new.ID, new.Name, new.Conditions, new.Current_Medications);
+                END;
+                CREATE TRIGGER IF NOT EXISTS patients_ad AFTER DELETE ON patients BEGIN
+                    INSERT INTO patients_fts(patients_fts, rowid, Name, Conditions, Current_Medications)
+                    VALUES ('delete', old.ID, old.Name, old.Conditions, old.Current_Medications);
+                END;
+                CREATE TRIGGER IF NOT EXISTS patients_au AFTER UPDATE ON patients BEGIN
+                    INSERT INTO patients_fts(patients_fts, rowid, Name, Conditions, Current_Medications)
+                    VALUES ('delete', old.ID, old.Name, old.Conditions, old.Current_Medications);
+                    INSERT INTO patients_fts(rowid, Name, Conditions, Current_Medications)
+                    VALUES (new.ID, new.Name, new.Conditions, new.Current_Medications);
+                END;
+            """)
+            if not has_fts:
+                conn.execute("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _write(self, conn, sql, params, many=False):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.executemany(sql, params) if many else conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cur
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def load(self):
+        return self._query("SELECT * FROM patients ORDER BY ID")
+
+    def count(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+        finally:
+            conn.close()
+
+    def get(self, patient_id):
+        if patient_id is None or pd.isna(patient_id):
+            return pd.DataFrame(columns=patient_columns)
+        return self._query("SELECT * FROM patients WHERE ID = ?", (int(patient_id),))
+
+    def add(self, patient):
+        columns = [c for c in patient_columns if c != "ID"]
+        conn = self._connect()
+        try:
+            cur = self._write(
+                conn, f"INSERT INTO patients ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                _to_row(patient.get(c) for c in columns))
+            return cur.lastrowid
+        finally:
+            conn.close()
+
+    def import_xlsx(self, path):
+        # an upsert: a row whose ID already exists updates that patient in
+        # place (the update trigger keeps the FTS index in step), other rows
+        # are inserted and patients missing from the workbook are kept. The
+        # Excel store instead replaces its workbook. add() always inserts
+        # under a new ID and ignores any ID it is given
+        df = normalize_patient_frame(pd.read_excel(path))
+        conn = self._connect()
+        try:
+            self._write(
+                conn, f"INSERT INTO patients ({', '.join(patient_columns)}) "
+                      f"VALUES ({', '.join('?' * len(patient_columns))}) "
+                      f"ON CONFLICT(ID) DO UPDATE SET "
+                      f"{', '.join(f'{c} = excluded.{c}' for c in patient_columns[1:])}",
+                (_to_row(row) for row in df.itertuples(index=False)), many=True)
+        finally:
+            conn.close()
+        return len(df)
+
+    def export_xlsx(self, path):
+        self.load().to_excel(path, index=False)
+
+    def query(self, page=1, size=50, disease=None, gender=None, age_min=None, age_max=None, text=None):
+        # one page of patients matching the filters, plus the total match count;
+        # filters use the column indexes and text search the FTS index
+        where, params = [], []
+        if disease:
+            where.append("Disease = ?")
+            params.append(disease)
+        if gender:
+            where.append("Gender = ?")
+            params.append(gender)
+        if age_min is not None:
+            where.append("Age >= ?")
+            params.append(age_min)
+        if age_max is not None:
+            where.append("Age <= ?")
+            params.append(age_max)
+        if text and text.strip():
+            where.append("ID IN (SELECT rowid FROM patients_fts WHERE patients_fts MATCH ?)")
+            params.append(_fts_prefix(text))
+        clause = " WHERE " + " AND ".join(where) if where else ""
+        size = int(size)
+        offset = (max(int(page), 1) - 1) * size
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM patients{clause}", params).fetchone()[0]
+            df = pd.read_sql_query(f"SELECT * FROM patients{clause} ORDER BY ID LIMIT ? OFFSET ?",
+                                   conn, params=params + [size, offset])
+        finally:
+            conn.close()
+        return df, total
+
+    def diseases(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT DISTINCT Disease FROM patients WHERE Disease IS NOT NULL ORDER BY Disease")
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+
+class CachedPatientStore:
+    # keeps the whole table in memory with an ID -> row index; the copy is
+    # dropped when the backing file's mtime/size changes or we write to it
+    def __init__(self, store):
+        self.store = store
+        self.path = store.path
+        self._lock = threading.Lock()
+        self._df = None
+        self._index = {}
+        self._signature = None
+
+    def _file_signature(self):
+        # SQLite in WAL mode writes to "<db>-wal" until it checkpoints
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _table(self):
+        signature = self._file_signature()
+        with self._lock:
+            if self._df is None or signature != self._signature:
+                df = self.store.load().reset_index(drop=True)
+                self._index = {int(pid): pos for pos, pid in enumerate(df['ID']) if not pd.isna(pid)}
+                self._df = df
+                self._signature = signature
+            return self._df, self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._df = None
+            self._index = {}
+            self._signature = None
+
+    def load(self):
+        df, _ = self._table()
+        return df.copy()
+
+    def count(self):
+        df, _ = self._table()
+        return len(df)
+
+    def get(self, patient_id):
+        df, index = self._table()
+        if patient_id is None or pd.isna(patient_id) or int(patient_id) != patient_id:
+            return df.iloc[0:0]
+        pos = index.get(int(patient_id))
+        if pos is None:
+            return df.iloc[0:0]
+        return df.iloc[[pos]]
+
+    def add(self, patient):
+        try:
+            return self.store.add(patient)
+        finally:
+            self.invalidate()
+
+    def import_xlsx(self, path):
+        try:
+            return self.store.import_xlsx(path)
+        finally:
+            self.invalidate()
+
+    def export_xlsx(self, path):
+        self.load().to_excel(path, index=False)
+
+    def query(self, page=1, size=50, **filters):
+        # SQLite answers from its indexes; the Excel store filters the cached table
+        if isinstance(self.store, ExcelPatientStore):
+            df, _ = self._table()
+            return query_frame(df, page, size, **filters)
+        return self.store.query(page, size, **filters)
+
+    def diseases(self):
+        if isinstance(self.store, ExcelPatientStore):
+            df, _ = self._table()
+            return sorted(df["Disease"].dropna().unique().tolist())
+        return self.store.diseases()
+
+
+def open_store(path):
+    if path.lower().endswith((".xlsx", ".xls")):
+        return ExcelPatientStore(path)
+    return SQLitePatientStore(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import or export the patient store as xlsx")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("xlsx")
+    parser.add_argument("store", nargs="?", default="patients.db")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    if args.action == "import":
+        print(f"Imported {store.import_xlsx(args.xlsx)} patients into {args.store}")
+    else:
+        store.export_xlsx(args.xlsx)
+        print(f"Exported {store.count()} patients to {args.xlsx}")
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+
+SCREENING_OPTION = "Medication screening"
+SCREENED_FIELDS = {"drug_interactions": "drug interactions", "contraindications": "contraindications"}
+NAME_FIELDS = ("brand_name", "generic_name", "substance_name")
+
+_split = re.compile(r"[,;/\n]|\band\b", re.IGNORECASE)
+_no_terms = {"", "none", "no", "nil", "n/a", "na", "-"}
+
+
+def normalize(term):
+    return " ".join(str(term).lower().split())
+
+
+def split_terms(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return []
+    return [term for term in (normalize(t) for t in _split.split(str(value))) if term not in _no_terms]
+
+
+def load_synonyms(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {normalize(name): [normalize(s) for s in synonyms] for name, synonyms in json.load(f).items()}
+
+
+def _trie_pattern(terms):
+    # a regex shaped like a trie ("warfarin|warfarin sodium|war..." becomes
+    # "war(?:farin(?:\s+sodium)?|...)"), so re scans each text once without
+    # retrying every term at every position
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [(r"\s+" if ch == " " else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class TermMatcher:
+    # every term compiled into one pattern; find() returns the concept of
+    # each whole-word match in a single pass over the text
+    def __init__(self, terms):
+        self.terms = dict(terms)
+        self.pattern = None
+        if self.terms:
+            self.pattern = re.compile(r"(?<!\w)(?:" + _trie_pattern(self.terms) + r")(?!\w)", re.IGNORECASE)
+
+    def find(self, text):
+        if self.pattern is None or not text:
+            return []
+        return [self.terms[normalize(m.group())] for m in self.pattern.finditer(text)]
+
+
+def label_names(item):
+    openfda = item.get("openfda", {})
+    names = {normalize(name) for field in NAME_FIELDS for name in openfda.get(field, [])}
+    return names, set(openfda.get("rxcui", []))
+
+
+def _ingredients(openfda):
+    substances = {normalize(name) for name in openfda.get("substance_name", [])}
+    if substances:
+        return substances
+    return {term for name in openfda.get("generic_name", []) for term in split_terms(name)}
+
+
+def label_synonyms(results):
+    # a name on a single-ingredient label, or its leading words ("metformin"
+    # for "metformin hydrochloride") -> the names of every single-ingredient
+    # label sharing its RxCUI. A combination product only maps its brand name
+    # to its ingredients, so one ingredient never pulls in the others
+    groups = {}
+    keys = {}
+    combinations = {}
+    for item in results:
+        openfda = item.get("openfda", {})
+        names, rxcuis = label_names(item)
+        ingredients = _ingredients(openfda)
+        if len(ingredients) > 1:
+            for brand in {normalize(name) for name in openfda.get("brand_name", [])} - ingredients:
+                combinations.setdefault(brand, set()).update(names)
+            continue
+        group_ids = rxcuis or ingredients or names
+        for group_id in group_ids:
+            groups.setdefault(group_id, set()).update(names)
+        for name in names:
+            words = name.split()
+            for i in range(1, len(words) + 1):
+                keys.setdefault(" ".join(words[:i]), set()).update(group_ids)
+    index = {key: set().union(*(groups[group_id] for group_id in group_ids)) for key, group_ids in keys.items()}
+    for brand, names in combinations.items():
+        index.setdefault(brand, set()).update(names)
+    return index
+
+
+def patient_terms(patient, label_index, synonyms=None):
+    # each medication/allergy plus its synonyms and the single-ingredient
+    # names sharing its RxCUI (see label_synonyms)
+    synonyms = synonyms or {}
+    terms = {}
+    for kind, field in (("medication", "Current_Medications"), ("allergy", "Allergies")):
+        for term in split_terms(patient.get(field)):
+            group = {term, *synonyms.get(term, []), *label_index.get(term, ())}
+            for synonym in group:
+                if not synonym.isdigit():
+                    terms.setdefault(synonym, (kind, term))
+    return terms
+
+
+def _describe(kind, term, where):
+    return f"{'interaction with' if kind == 'medication' else 'allergy to'} {term} ({where})"
+
+
+def _label_hits(matcher, item):
+    # (where, concept) for every term found in one label
+    hits = []
+    own_names = " ; ".join(label_names(item)[0])
+    for concepts in matcher.find(own_names):
+        hits.extend(("drug itself", concept) for concept in concepts if concept[0] == "allergy")
+    for field, where in SCREENED_FIELDS.items():
+        text = item.get(field, "")
+        text = " ".join(map(str, text)) if isinstance(text, list) else str(text)
+        for concepts in matcher.find(text):
+            hits.extend((where, concept) for concept in concepts)
+    return hits
+
+
+def screen_patients(results, names, patients, synonyms=None):
+    # the terms of all patients go into one matcher, so each label is scanned
+    # once however many patients share these results. Pass every label of a
+    # run at once: the synonym map is built from these results
+    label_index = label_synonyms(results)
+    patient_concepts = []
+    union = {}
+    for patient in patients:
+        terms = patient_terms(patient, label_index, synonyms)
+        patient_concepts.append(set(terms.values()))
+        for term, concept in terms.items():
+            union.setdefault(term, set()).add(concept)
+    matcher = TermMatcher(union)
+    hits = [_label_hits(matcher, item) for item in results]
+
+    screened = []
+    for concepts in patient_concepts:
+        records = []
+        for brand_name, label_hits in zip(names, hits):
+            conflicts = [_describe(kind, term, where) for where, (kind, term) in label_hits if (kind, term) in concepts]
+            conflicts = list(dict.fromkeys(conflicts))
+            records.append({"Drug": brand_name, "Section": SCREENING_OPTION, "Label": "",
+                            "Text": "; ".join(conflicts) if conflicts else "no conflicts found"})
+        screened.append(records)
+    return screened
+
+
+def screen_results(results, names, patient, synonyms=None):
+    return screen_patients(results, names, [patient], synonyms)[0]
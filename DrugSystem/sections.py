@@ -0,0 +1,103 @@
+from collections import namedtuple
+
+from summarization import summarize_text
+
+# field: label key to read, from the label itself or its "openfda" block
+# label: text shown after the drug name ("pregnancy" -> "Brand pregnancy : ...")
+# sentences: sentence cap without BART (None shows the text as is)
+# bart_sentences / bart_tokens: sentence cap before BART and BART max_length;
+#   bart_tokens=None means the part is never sent to BART
+Part = namedtuple("Part", ["field", "label", "sentences", "bart_sentences", "bart_tokens", "source"],
+                  defaults=("", None, None, None, "item"))
+
+# combine: join all parts into one entry (shown only if one part has text)
+# keep_empty: show every part even when the label has no text for it
+Section = namedtuple("Section", ["parts", "combine", "keep_empty"], defaults=(False, False))
+
+SECTIONS = {
+    "Drug interactions": Section([Part("drug_interactions", sentences=9, bart_sentences=8, bart_tokens=200)]),
+    "Patient's conditions (pregnancy, allergies, ...)": Section([
+        Part("pregnancy", "pregnancy", sentences=10, bart_sentences=5, bart_tokens=200),
+        Part("nursing_mothers", "nursing_mothers", bart_sentences=4, bart_tokens=150),
+        Part("use_in_specific_populations", "use_in_specific_populations", sentences=11, bart_sentences=10, bart_tokens=300),
+    ], keep_empty=True),
+    "Warnings": Section([
+        Part("boxed_warning", sentences=5, bart_sentences=5, bart_tokens=100),
+        Part("precautions", sentences=10, bart_sentences=10, bart_tokens=300),
+        Part("warnings", sentences=13, bart_sentences=6, bart_tokens=500),
+        Part("warnings_and_cautions", sentences=10, bart_sentences=10, bart_tokens=200),
+    ], combine=True),
+    "Dosage forms": Section([Part("dosage_forms_and_strengths", bart_tokens=50)]),
+    "Dosage administration": Section([Part("dosage_and_administration", bart_tokens=200)]),
+    "Adverse reactions": Section([Part("adverse_reactions", sentences=15, bart_sentences=15, bart_tokens=400)]),
+    "Clinical studies": Section([Part("clinical_studies", sentences=15, bart_sentences=15, bart_tokens=500)]),
+    "Drug name": Section([]),
+    "Contraindications": Section([Part("contraindications", bart_tokens=150)]),
+    "Geriatric use": Section([Part("geriatric_use", sentences=4, bart_sentences=4, bart_tokens=100)]),
+    "Pharmacodynamics": Section([Part("pharmacodynamics", sentences=15, bart_sentences=15, bart_tokens=400)]),
+    "Pharmacokinetics": Section([Part("pharmacokinetics", sentences=9, bart_sentences=6, bart_tokens=500)]),
+    "Description": Section([Part("description", sentences=6, bart_sentences=6, bart_tokens=150)]),
+    "Nonclinical toxicology": Section([Part("nonclinical_toxicology", sentences=5, bart_sentences=5, bart_tokens=150)]),
+    "Mechanism of action": Section([Part("mechanism_of_action", sentences=9, bart_sentences=9, bart_tokens=250)]),
+    "Teratogenic effects": Section([Part("teratogenic_effects", sentences=3, bart_sentences=6, bart_tokens=200)]),
+    "Overdosage": Section([Part("overdosage", sentences=8, bart_sentences=8, bart_tokens=200)]),
+    "Drug route": Section([Part("route", source="openfda")]),
+    "Drug RxCUI": Section([Part("rxcui", source="openfda")]),
+    "Carcinogenesis impairment of fertility": Section([
+        Part("carcinogenesis_and_mutagenesis_and_impairment_of_fertility", bart_tokens=150)]),
+    "Risks": Section([Part("risks", sentences=5, bart_sentences=6, bart_tokens=200)]),
+    "Clinical pharmacology": Section([Part("clinical_pharmacology", sentences=20, bart_sentences=15, bart_tokens=250)]),
+}
+
+record_columns = ["Drug", "Section", "Label", "Text"]
+
+
+def _part_text(part, item, use_bart, batch):
+    source = item.get("openfda", {}) if part.source == "openfda" else item
+    value = source.get(part.field, "")
+    if isinstance(value, list):
+        value = (", " if part.source == "openfda" else " ").join(map(str, value))
+    value = str(value).strip()
+    if not value:
+        return False, ""
+    if use_bart and part.bart_tokens:
+        if part.bart_sentences:
+            value = summarize_text(value, part.bart_sentences)
+        return True, batch.add(value, part.bart_tokens)
+    if part.sentences:
+        value = summarize_text(value, part.sentences)
+    return True, value
+
+
+def extract_sections(results, names, options, use_bart=False, batch=None):
+    # one pass over the labels for every requested option; with use_bart the
+    # texts are queued on `batch` and resolved once it has run
+    pending = []
+    for item, brand_name in zip(results, names):
+        for option in options:
+            section = SECTIONS[option]
+            if not section.parts:
+                pending.append((brand_name, option, "", []))
+                continue
+            texts = [(part, *_part_text(part, item, use_bart, batch)) for part in section.parts]
+            if section.combine:
+                if any(found for _, found, _ in texts):
+                    pending.append((brand_name, option, "", [text for _, found, text in texts if found]))
+                continue
+            for part, found, text in texts:
+                if found or section.keep_empty:
+                    pending.append((brand_name, option, part.label, [text]))
+
+    if use_bart and batch is not None:
+        batch.run()
+    return [{"Drug": drug, "Section": option, "Label": label, "Text": " ".join(map(str, texts))}
+            for drug, option, label, texts in pending]
+
+
+def format_records(records):
+    lines = []
+    for record in records:
+        name = f"{record['Drug']} {record['Label']}" if record["Label"] else record["Drug"]
+        section = SECTIONS.get(record["Section"])
+        lines.append(name if section is not None and not section.parts else f"{name} : {record['Text']}")
+    return "\n\n".join(lines)
@@ -0,0 +1,218 @@
+import math
+import re
+import threading
+from collections import Counter
+
+import metrics
+
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+# distilbart: the fp32 pipeline; distilbart-int8: the same model with its
+# Linear layers dynamically quantized to int8; extractive: no model, picks the
+# most representative sentences that fit the length limit
+SUMMARIZER_BACKENDS = ("distilbart", "distilbart-int8", "extractive")
+DEFAULT_BACKEND = "distilbart"
+
+_pipelines = {}
+_threads = None
+_sent_tokenize = None
+_lock = threading.Lock()
+
+def sent_tokenize(text):
+    # nltk and its punkt data are only loaded (and downloaded) on first use
+    global _sent_tokenize
+    if _sent_tokenize is None:
+        with _lock:
+            if _sent_tokenize is None:
+                import nltk
+                from nltk.tokenize import sent_tokenize as tokenize
+                try:
+                    tokenize("Ready.")
+                except LookupError:
+                    nltk.download('punkt', quiet=True)
+                    nltk.download('punkt_tab', quiet=True)
+                _sent_tokenize = tokenize
+    return _sent_tokenize(text)
+
+def set_threads(threads):
+    # torch intra-op threads for the model backends; 0/None keeps torch's default
+    global _threads
+    _threads = threads or None
+    if _threads and _pipelines:
+        import torch
+        torch.set_num_threads(_threads)
+
+def check_backend(backend):
+    # names come from clients; an unknown one must not build (and keep) a model
+    if backend not in SUMMARIZER_BACKENDS:
+        raise ValueError(f"Unknown summarizer {backend!r}; expected one of {', '.join(SUMMARIZER_BACKENDS)}")
+    return backend
+
+def _build_pipeline(backend):
+    if backend not in ("distilbart", "distilbart-int8"):
+        raise ValueError(f"{backend!r} is not a model backend")
+    import torch
+    from transformers import pipeline
+    if _threads:
+        torch.set_num_threads(_threads)
+    if backend == "distilbart-int8":
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        model = AutoModelForSeq2SeqLM.from_pretrained(SUMMARIZER_MODEL)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(SUMMARIZER_MODEL))
+    return pipeline("summarization", model=SUMMARIZER_MODEL)
+
+def summarizer(*args, backend=DEFAULT_BACKEND, **kwargs):
+    # each model backend is built the first time a summary asks for it
+    check_backend(backend)
+    if backend not in _pipelines:
+        with _lock:
+            if backend not in _pipelines:
+                _pipelines[backend] = _build_pipeline(backend)
+    return _pipelines[backend](*args, **kwargs)
+
+_word = re.compile(r"[a-z][a-z0-9\-]+")
+_stopwords = set("""a an and are as at be been but by can for from has have if in into is it its may
+more no not of on or other should such than that the their these this those to was were when which
+while who will with""".split())
+
+def extractive_summary(text, max_tokens=500):
+    # scores each sentence by how common its content words are in the whole
+    # text, then keeps the best ones that fit in max_tokens (about 0.75 words
+    # per token), in their original order
+    sentences = sent_tokenize(text)
+    budget = max(int(max_tokens * 0.75), 1)
+    words = [[w for w in _word.findall(sentence.lower()) if w not in _stopwords] for sentence in sentences]
+    frequency = Counter(w for sentence_words in words for w in set(sentence_words))
+    if not frequency:
+        return " ".join(text.split()[:budget])
+    top = max(frequency.values())
+    scores = []
+    for i, sentence_words in enumerate(words):
+        unique = set(sentence_words)
+        score = sum(frequency[w] for w in unique) / top / math.sqrt(len(unique) + 1)
+        # a slight preference for the opening sentences, which usually state the topic
+        scores.append((score * (1.0 + 0.5 / (i + 1)), i))
+
+    chosen = []
+    used = 0
+    for _, i in sorted(scores, reverse=True):
+        length = len(sentences[i].split())
+        if used + length <= budget:
+            chosen.append(i)
+            used += length
+    if not chosen:
+        return " ".join(sentences[max(scores)[1]].split()[:budget])
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+summary_cache = None
+
+def use_summary_cache(cache):
+    # summaries are keyed by (kind, cleaned text, length limit), so the same
+    # label section is only summarized once across patients and queries
+    global summary_cache
+    summary_cache = cache
+
+def _cached(kind, text, limit):
+    if summary_cache is None:
+        return None
+    summary = summary_cache.get((kind, text, limit))
+    metrics.count("summary_cache_hits" if summary is not None else "summary_cache_misses")
+    return summary
+
+def _remember(kind, text, limit, summary):
+    if summary_cache is not None:
+        summary_cache.set((kind, text, limit), summary)
+
+def clean_text(text):
+    text = re.sub(r'\(see[^\)]*\)', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+def summarize_text(text, max_sentences=6):
+    if isinstance(text, list):
+        text = " ".join(text)
+    text = clean_text(text)
+    if not text:
+        return ""
+    summary = _cached("sentences", text, max_sentences)
+    if summary is None:
+        with metrics.span("sent_tokenize"):
+            sentences = sent_tokenize(text)
+        summary = ' '.join(sentences[:max_sentences])
+        _remember("sentences", text, max_sentences, summary)
+    return summary
+
+def _summarize(texts, max_tokens, batch_size, backend):
+    name = backend.replace("-", "_")
+    metrics.count(f"{name}_texts", len(texts))
+    with metrics.span(name):
+        if backend == "extractive":
+            return [extractive_summary(text, max_tokens) for text in texts]
+        metrics.count(f"{name}_batches", -(-len(texts) // batch_size))
+        results = summarizer(texts, backend=backend, batch_size=batch_size, truncation=True,
+                             max_length=max_tokens, min_length=3, do_sample=False)
+        return [result['summary_text'] for result in results]
+
+def summarize_short(text, max_tokens=500, backend=DEFAULT_BACKEND):
+    check_backend(backend)
+    short_summary = _cached(backend, text, max_tokens)
+    if short_summary is None:
+        short_summary = _summarize([text], max_tokens, 1, backend)[0]
+        _remember(backend, text, max_tokens, short_summary)
+    return short_summary
+
+def summarize_many(jobs, batch_size=8, backend=DEFAULT_BACKEND):
+    # jobs are (text, max_tokens) pairs; texts sharing a max_tokens go through
+    # the backend together, shortest first so each batch pads to similar lengths
+    check_backend(backend)
+    outputs = [""] * len(jobs)
+    groups = {}
+    for i, (text, max_tokens) in enumerate(jobs):
+        if isinstance(text, list):
+            text = " ".join(text)
+        text = clean_text(str(text))
+        if text:
+            groups.setdefault(max_tokens, {}).setdefault(text, []).append(i)
+
+    for max_tokens, by_text in groups.items():
+        texts = []
+        for text, indices in by_text.items():
+            summary = _cached(backend, text, max_tokens)
+            if summary is None:
+                texts.append(text)
+                continue
+            for i in indices:
+                outputs[i] = summary
+        if not texts:
+            continue
+        texts.sort(key=len)
+        for text, summary in zip(texts, _summarize(texts, max_tokens, batch_size, backend)):
+            _remember(backend, text, max_tokens, summary)
+            for i in by_text[text]:
+                outputs[i] = summary
+    return outputs
+
+class PendingSummary:
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __str__(self):
+        return self.batch.results[self.index]
+
+class SummaryBatch:
+    # collects every text an analysis needs, then summarizes them in one go
+    def __init__(self, batch_size=8, backend=DEFAULT_BACKEND):
+        self.batch_size = batch_size
+        self.backend = check_backend(backend)
+        self.jobs = []
+        self.results = []
+
+    def add(self, text, max_tokens=500):
+        self.jobs.append((text, max_tokens))
+        return PendingSummary(self, len(self.jobs) - 1)
+
+    def run(self):
+        if self.jobs:
+            self.results = summarize_many(self.jobs, self.batch_size, self.backend)
+        return self.results
@@ -0,0 +1,110 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+from http_client import HttpClient
+
+
+class StandIn:
+    # a local server that answers with the scripted (status, headers) in order,
+    # repeating the last one, and counts the requests it gets
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, headers = stand_in.script[min(stand_in.hits, len(stand_in.script) - 1)]
+                stand_in.hits += 1
+                body = b'{"results": []}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/drug/label.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(http_client.time, "sleep", delays.append)
+    return delays
+
+
+def serve(script):
+    stand_in = StandIn(script)
+    client = HttpClient(timeout=5, retries=3, backoff=0.5, max_backoff=30)
+    return stand_in, client
+
+
+def test_retry_after_then_success(sleeps):
+    stand_in, client = serve([(429, {"Retry-After": "2"}), (200, {})])
+    try:
+        response = client.get(stand_in.url, params={"search": "x"})
+    finally:
+        client.close()
+        stand_in.close()
+    assert response.status_code == 200
+    assert stand_in.hits == 2
+    assert sleeps == [2.0]
+
+
+def test_retry_after_is_capped(sleeps):
+    stand_in, client = serve([(429, {"Retry-After": "600"}), (200, {})])
+    try:
+        assert client.get(stand_in.url).status_code == 200
+    finally:
+        client.close()
+        stand_in.close()
+    assert sleeps == [30.0]
+
+
+def test_backoff_without_retry_after(sleeps):
+    stand_in, client = serve([(503, {}), (502, {}), (200, {})])
+    try:
+        assert client.get(stand_in.url).status_code == 200
+    finally:
+        client.close()
+        stand_in.close()
+    assert stand_in.hits == 3
+    # jittered exponential backoff: attempt n waits at most backoff * 2**n
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= 0.5 * 2 ** attempt for attempt, delay in enumerate(sleeps))
+
+
+def test_gives_up_after_retries(sleeps):
+    stand_in, client = serve([(503, {})])
+    try:
+        response = client.get(stand_in.url)
+    finally:
+        client.close()
+        stand_in.close()
+    assert response.status_code == 503
+    assert stand_in.hits == client.retries + 1
+    assert len(sleeps) == client.retries
+
+
+def test_no_retry_on_client_error(sleeps):
+    stand_in, client = serve([(404, {}), (200, {})])
+    try:
+        assert client.get(stand_in.url).status_code == 404
+    finally:
+        client.close()
+        stand_in.close()
+    assert stand_in.hits == 1
+    assert sleeps == []
@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from patient_store import open_store
+
+PROCESSES = 4
+THREADS = 4
+
+
+def _insert(path, worker, count):
+    # count patients added by one thread; each process opens its own store
+    store = open_store(path)
+    return [store.add({"Name": f"w{worker}-{i}", "Age": 30, "Disease": "Asthma"}) for i in range(count)]
+
+
+def _insert_from_threads(path, process, per_thread):
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(_insert, path, process * THREADS + t, per_thread) for t in range(THREADS)]
+        return [pid for future in futures for pid in future.result()]
+
+
+def _run(path, per_thread):
+    with ProcessPoolExecutor(PROCESSES) as pool:
+        futures = [pool.submit(_insert_from_threads, path, p, per_thread) for p in range(PROCESSES)]
+        return [pid for future in futures for pid in future.result()]
+
+
+@pytest.mark.parametrize("suffix, per_thread", [(".db", 25), (".xlsx", 2)])
+def test_parallel_inserts_are_not_lost_or_duplicated(tmp_path, suffix, per_thread):
+    path = str(tmp_path / f"patients{suffix}")
+    open_store(path)
+    ids = _run(path, per_thread)
+    total = PROCESSES * THREADS * per_thread
+
+    assert len(ids) == total
+    assert sorted(ids) == list(range(1, total + 1))
+    df = open_store(path).load()
+    assert len(df) == total
+    assert df["ID"].is_unique
+    assert sorted(df["Name"]) == sorted(f"w{w}-{i}" for w in range(PROCESSES * THREADS) for i in range(per_thread))
+
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# synthetic video-platform events, drawn column by column as NumPy arrays;
+# the number of events per day is drawn up front, so any slice of rows can be
+# generated on its own and a dataset of any size streams out in fixed-size chunks
+EVENTS = pd.CategoricalDtype(["login", "play_video", "like", "comment", "logout"])
+EVENT_P = [0.2, 0.4, 0.2, 0.1, 0.1]
+PLATFORMS = pd.CategoricalDtype(["web", "ios", "android"])
+SCORE_MAP = {"comment": 5, "like": 3, "play_video": 1, "login": 0, "logout": 0}
+
+# random draws are made per block of BLOCK_ROWS rows from a stream derived from
+# the seed and the block number, so the data does not depend on how it is chunked
+BLOCK_ROWS = 1 << 16
+
+# video_id is set for these events, watch time and duration only for play_video
+_video_codes = [EVENTS.categories.get_loc(e) for e in ("play_video", "like", "comment")]
+_play_code = EVENTS.categories.get_loc("play_video")
+
+
+def _nullable(values, missing):
+    # values where not missing, <NA> elsewhere, without going through objects
+    return pd.arrays.IntegerArray(values, missing)
+
+
+def _root(rng):
+    return rng if isinstance(rng, np.random.SeedSequence) else np.random.SeedSequence(rng)
+
+
+def _stream(root, key):
+    # the same generator for the same (seed, key), however often it is asked for
+    return np.random.default_rng(np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (key,)))
+
+
+def daily_counts(num_days=90, events_per_day=(50, 150), rng=None):
+    # events on each day, uniform in [low, high) like np.random.randint
+    return _stream(_root(rng), 0).integers(events_per_day[0], events_per_day[1], num_days)
+
+
+def _block(block, total, num_users, root):
+    # every random column of one block; block b uses stream b + 1 (0 is the day counts)
+    rng = _stream(root, block + 1)
+    n = min(BLOCK_ROWS, total - block * BLOCK_ROWS)
+    return (rng.integers(0, 86400, n, dtype=np.int32),
+            rng.choice(len(EVENT_P), n, p=EVENT_P).astype(np.int8),
+            rng.integers(0, len(PLATFORMS.categories), n, dtype=np.int8),
+            rng.integers(1, num_users + 1, n, dtype=np.int32),
+            rng.integers(1, 50, n, dtype=np.int16),
+            rng.integers(5, 500, n, dtype=np.int16),
+            rng.integers(60, 600, n, dtype=np.int16))
+
+
+def generate_rows(first, last, day_ends, start="2025-05-01", num_users=100, rng=None):
+    # rows first..last-1 of the dataset whose days end at the cumulative day_ends
+    root = _root(rng)
+    total = int(day_ends[-1]) if len(day_ends) else 0
+    parts = []
+    for block in range(first // BLOCK_ROWS, -(-last // BLOCK_ROWS)):
+        offset = block * BLOCK_ROWS
+        parts.append([column[max(first - offset, 0):last - offset] for column in _block(block, total, num_users, root)])
+    if parts:
+        columns = [np.concatenate(column) for column in zip(*parts)]
+    else:
+        columns = [np.empty(0, dtype) for dtype in (np.int32, np.int8, np.int8, np.int32, np.int16, np.int16, np.int16)]
+    seconds, event, platform, user_id, video_id, watch_time, duration = columns
+    event_id = np.arange(first + 1, last + 1, dtype=np.int64)
+    day = np.searchsorted(day_ends, event_id - 1, side="right")
+    timestamp = np.datetime64(start, "D") + day.astype("timedelta64[D]") + seconds.astype("timedelta64[s]")
+    no_video = ~np.isin(event, _video_codes)
+    not_played = event != _play_code
+    return pd.DataFrame({
+        "event_id": event_id,
+        "user_id": user_id,
+        "timestamp": timestamp.astype("datetime64[ns]"),
+        "platform": pd.Categorical.from_codes(platform, dtype=PLATFORMS),
+        "event_type": pd.Categorical.from_codes(event, dtype=EVENTS),
+        "video_id": _nullable(video_id, no_video),
+        "watch_time_sec": _nullable(watch_time, not_played),
+        "video_duration_sec": _nullable(duration, not_played),
+    })
+
+
+def iter_events(start="2025-05-01", num_days=90, num_users=100, events_per_day=(50, 150), chunk_rows=1_000_000,
+                rng=None):
+    # the dataset chunk_rows events at a time; rng is a seed (or SeedSequence),
+    # and the rows are the same whatever chunk_rows is
+    root = _root(rng)
+    day_ends = np.cumsum(daily_counts(num_days, events_per_day, root))
+    total = int(day_ends[-1]) if num_days else 0
+    for first in range(0, total, chunk_rows):
+        yield generate_rows(first, min(first + chunk_rows, total), day_ends, start, num_users, root)
+
+
+def generate_events(start="2025-05-01", num_days=90, num_users=100, events_per_day=(50, 150), rng=None):
+    # the whole dataset as one frame, equal to concatenating iter_events' chunks
+    root = _root(rng)
+    day_ends = np.cumsum(daily_counts(num_days, events_per_day, root))
+    return generate_rows(0, int(day_ends[-1]) if num_days else 0, day_ends, start, num_users, root)
+
+
+def engagement_score(event_type):
+    # per-event score from the categorical event type, via its codes; int64 so
+    # daily sums cannot overflow however many events a day has
+    scores = np.array([SCORE_MAP[e] for e in EVENTS.categories], dtype=np.int64)
+    return pd.Series(scores[event_type.cat.codes.to_numpy()], index=event_type.index, name="engagement_score")
+
+
+def write_events(path, start="2025-05-01", num_days=90, num_users=100, events_per_day=(50, 150),
+                 chunk_rows=1_000_000, rng=None, compression="snappy"):
+    # streams the dataset to one Parquet file; memory stays at about one chunk.
+    # An empty dataset still gets a file with the schema
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(generate_rows(0, 0, np.zeros(0, dtype=np.int64), start), preserve_index=False)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for chunk in iter_events(start, num_days, num_users, events_per_day, chunk_rows, rng):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic engagement event dataset to Parquet")
+    parser.add_argument("output", help="Parquet file to write")
+    parser.add_argument("--start", default="2025-05-01")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--events-per-day", type=int, nargs=2, default=[50, 150], metavar=("LOW", "HIGH"))
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--compression", default="snappy")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = write_events(args.output, args.start, args.days, args.users, args.events_per_day, args.chunk_rows,
+                        args.seed, args.compression)
+    print(f"{rows} events written to {args.output}")
@@ -0,0 +1,161 @@
+import csv
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from phase_retrieval import ALGORITHMS, PhaseRetrieval, make_phantom, sample_magnitudes
+
+# Sweeps phase retrieval over image size, sampling rate, noise level,
+# algorithm and dtype on the circle/square/ring phantom. Every case uses the
+# same seed for the frequency mask, the noise and the starting phases, so two
+# runs (or two commits) see identical inputs.
+
+report_columns = ["size", "sampling_rate", "noise_sigma", "algorithm", "dtype", "iterations",
+                  "ms_per_iteration", "fft_share", "setup_ms", "inputs_rss_mb", "peak_rss_mb",
+                  "final_error", "object_error"]
+
+
+class TimedPhaseRetrieval(PhaseRetrieval):
+    # the engine with its FFTs timed, to split the runtime into FFT and the rest
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fft_seconds = 0.0
+
+    def _fft(self, transform, k):
+        start = time.perf_counter()
+        super()._fft(transform, k)
+        self.fft_seconds += time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    # VmHWM covers every allocation, pocketfft's buffers included, and starts
+    # over in each case's process; ru_maxrss is the fallback off Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def object_error(image, truth):
+    return float(np.linalg.norm(image - truth) / np.linalg.norm(truth))
+
+
+def run_case(size, sampling_rate, noise_sigma, algorithm, dtype, iterations, seed=0, beta=0.9, workers=-1):
+    # meant to run in a fresh process (see run_case_process): inputs_rss_mb is
+    # the high-water mark once the phantom and magnitudes exist, peak_rss_mb
+    # the one after the engine has run
+    truth = make_phantom(size)
+    M, freq_mask, _ = sample_magnitudes(truth, sampling_rate, noise_sigma, rng=seed)
+    inputs_rss = peak_rss_mb()
+    start = time.perf_counter()
+    engine = TimedPhaseRetrieval(M, freq_mask, truth > 0, workers=workers, dtype=dtype)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    image, errors = engine.run(iterations, rng=seed, algorithm=algorithm, beta=beta)
+    elapsed = time.perf_counter() - start
+    return {
+        "size": size, "sampling_rate": sampling_rate, "noise_sigma": noise_sigma, "algorithm": algorithm,
+        "dtype": np.dtype(dtype).name, "iterations": len(errors),
+        "ms_per_iteration": round(elapsed / len(errors) * 1000, 3),
+        "fft_share": round(engine.fft_seconds / elapsed, 3),
+        "setup_ms": round(setup * 1000, 3),
+        "inputs_rss_mb": inputs_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "final_error": float(errors[-1]),
+        "object_error": object_error(image, truth),
+        "errors": errors.tolist(),
+    }
+
+
+def run_case_process(*case, **options):
+    # one case per child process, so its memory figures are its own
+    spec = {"case": case, "options": options}
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--case"], input=json.dumps(spec),
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"case {case} failed: {proc.stderr.strip()}")
+    return json.loads(proc.stdout)
+
+
+def run(sizes=(256, 512, 1024), sampling_rates=(0.6,), noise_sigmas=(0.02,), algorithms=ALGORITHMS,
+        dtypes=("float64", "float32"), iterations=100, seed=0, beta=0.9, workers=-1, curves=False):
+    results = []
+    for case in itertools.product(sizes, sampling_rates, noise_sigmas, algorithms, dtypes):
+        result = run_case_process(*case, iterations=iterations, seed=seed, beta=beta, workers=workers)
+        if not curves:
+            result.pop("errors")
+        print(json.dumps({k: result[k] for k in report_columns}), file=sys.stderr)
+        results.append(result)
+    return {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+                 "scipy": scipy.__version__, "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": seed, "beta": beta, "workers": workers,
+                 "iterations": iterations, "process_per_case": True},
+        "results": results,
+    }
+
+
+def write_csv(report, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=report_columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(report["results"])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark phase retrieval on the synthetic phantom")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--sampling-rates", type=float, nargs="+", default=[0.6])
+    parser.add_argument("--noise-sigmas", type=float, nargs="+", default=[0.02])
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument("--dtypes", nargs="+", choices=["float64", "float32"], default=["float64", "float32"])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--beta", type=float, default=0.9)
+    parser.add_argument("--workers", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--curves", action="store_true", help="include each case's error curve in the JSON")
+    parser.add_argument("--output", default="-", help="JSON report path (default: stdout)")
+    parser.add_argument("--csv", help="also write a CSV table")
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # a single case described on stdin, run by run_case_process
+        spec = json.load(sys.stdin)
+        json.dump(run_case(*spec["case"], **spec["options"]), sys.stdout)
+        sys.exit()
+
+    report = run(args.sizes, args.sampling_rates, args.noise_sigmas, args.algorithms, args.dtypes,
+                 args.iterations, args.seed, args.beta, args.workers, args.curves)
+    if args.csv:
+        write_csv(report, args.csv)
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,412 @@
+import os
+
+import numpy as np
+from scipy.fft import fft2, ifft2, ifftshift
+
+
+def make_phantom(N=256, dtype=float):
+    # the test image from Numpy.py: a disk, a square and a ring
+    img = np.zeros((N, N), dtype=dtype)
+    yy, xx = np.ogrid[:N, :N]
+    circle = (xx - N // 2) ** 2 + (yy - N // 2) ** 2 <= (N // 6) ** 2
+    img[circle] = 1.0
+    img[N // 4:N // 4 + 40, N // 4:N // 4 + 40] = 0.7
+    r2 = (xx - 3 * N // 4) ** 2 + (yy - N // 4) ** 2
+    img[(r2 <= (N // 8) ** 2) & (r2 >= (N // 8 - 5) ** 2)] = 0.9
+    return img
+
+
+def sample_magnitudes(img, sampling_rate=0.6, noise_sigma=0.02, rng=None):
+    # a random subset of the (centered) Fourier magnitudes with Gaussian noise;
+    # returns M, freq_mask and the full magnitude
+    rng = np.random.default_rng(rng)
+    magnitude_full = np.abs(np.fft.fftshift(fft2(img)))
+    freq_mask = np.zeros(img.shape, dtype=bool)
+    freq_mask.flat[rng.choice(img.size, int(sampling_rate * img.size), replace=False)] = True
+    M = np.zeros(img.shape)
+    M[freq_mask] = magnitude_full[freq_mask]
+    M[freq_mask] += noise_sigma * magnitude_full.max() * rng.standard_normal(int(freq_mask.sum()))
+    return M, freq_mask, magnitude_full
+
+
+def write_phantom(directory, N=256, sampling_rate=0.6, noise_sigma=0.02, rng=None, dtype=np.float32):
+    # M.npy, freq_mask.npy, support.npy (and truth.npy) for the file-based mode;
+    # the mask is a per-frequency coin flip rather than an exact sample count
+    import os
+    from numpy.lib.format import open_memmap
+    rng = np.random.default_rng(rng)
+    os.makedirs(directory, exist_ok=True)
+    img = make_phantom(N, dtype)
+    np.save(os.path.join(directory, "truth.npy"), img)
+    np.save(os.path.join(directory, "support.npy"), img > 0)
+    magnitude = np.abs(fft2(img, workers=-1))
+    peak = magnitude.max()
+    magnitude = np.fft.fftshift(magnitude)
+    M = open_memmap(os.path.join(directory, "M.npy"), mode="w+", dtype=magnitude.dtype, shape=img.shape)
+    freq_mask = open_memmap(os.path.join(directory, "freq_mask.npy"), mode="w+", dtype=bool, shape=img.shape)
+    for r0 in range(0, N, 256):
+        rows = slice(r0, min(r0 + 256, N))
+        mask = rng.random(magnitude[rows].shape, dtype=np.float32) < sampling_rate
+        noise = noise_sigma * peak * rng.standard_normal(magnitude[rows].shape, dtype=np.float32)
+        freq_mask[rows] = mask
+        M[rows] = np.where(mask, magnitude[rows] + noise, 0)
+    M.flush()
+    freq_mask.flush()
+    return directory
+
+
+def _rows(a, r0, r1, centered):
+    # rows r0:r1 of ifftshift(a) (or of a itself), read without building the
+    # whole shifted array, so `a` can be a memory-mapped .npy
+    if not centered:
+        return np.asarray(a[r0:r1])
+    nr, nc = a.shape
+    return np.roll(np.asarray(a[(np.arange(r0, r1) + nr // 2) % nr]), -(nc // 2), axis=1)
+
+
+def _fft_inplace(transform, buf, workers):
+    # scipy.fft transforms complex input in place with overwrite_x; copy back
+    # only if a build hands out a new array instead
+    out = transform(buf, workers=workers, overwrite_x=True)
+    if not np.may_share_memory(out, buf):
+        buf[...] = out
+
+
+# er: error reduction (Gerchberg-Saxton): project onto the object constraints
+#     (zero outside the support, non-negative) after every Fourier projection
+# hio: Fienup's hybrid input-output; pixels that break the constraints are
+#      pushed away by beta times their value instead of being zeroed
+# raar: relaxed averaged alternating reflections (Luke), a relaxed HIO that
+#       stalls less on noisy data
+ALGORITHMS = ("er", "hio", "raar")
+
+
+class PhaseRetrieval:
+    # Phase retrieval from measured magnitudes M on freq_mask for an object
+    # that is zero outside support_mask and non-negative.
+    #
+    # M and freq_mask are given centered (fftshift-ed) as in Numpy.py; they are
+    # unshifted once here so the loop works on the raw FFT layout. Masks become
+    # flat index arrays and every per-iteration array is a preallocated buffer;
+    # the FFTs run in place (overwrite_x) on the complex work buffer.
+    #
+    # Buffers hold a stack of starts, one row each, so run_batch() iterates K
+    # random initializations with one batched FFT per step; run() is K = 1.
+    # dtype=np.float32 runs everything in float32/complex64. Inputs are read a
+    # block of rows at a time and only the masked magnitudes are kept, so they
+    # may be memory-mapped; the engine then holds about seven float32 frames
+    # (nine for HIO/RAAR) of buffers and indices whatever the input size.
+    #
+    # Every algorithm shares _fourier_projection() and differs only in the
+    # object-space update. Errors are always those of the constrained estimate
+    # (support and positivity applied): free for ER, one extra forward FFT per
+    # iteration for HIO and RAAR, whose own iterates break the constraints.
+    def __init__(self, M, freq_mask, support_mask, workers=-1, centered=True, dtype=np.float64, block_rows=256):
+        self.shape = tuple(M.shape)
+        self.workers = workers
+        self.centered = centered
+        self.dtype = np.dtype(dtype)
+        self.cdtype = np.result_type(self.dtype, np.complex64)
+        rows, cols = self.shape
+        index_dtype = np.int32 if M.size < 2 ** 31 else np.int64
+        samples = int(np.count_nonzero(freq_mask))
+        self.freq_idx = np.empty(samples, dtype=index_dtype)
+        self.M_vals = np.empty(samples, dtype=self.dtype)
+        pos = 0
+        for r0 in range(0, rows, block_rows):
+            r1 = min(r0 + block_rows, rows)
+            flat = np.flatnonzero(_rows(freq_mask, r0, r1, centered))
+            self.freq_idx[pos:pos + len(flat)] = flat + r0 * cols
+            self.M_vals[pos:pos + len(flat)] = _rows(M, r0, r1, centered).ravel()[flat]
+            pos += len(flat)
+        self.M_norm = float(np.linalg.norm(self.M_vals))
+        self.support = np.asarray(support_mask, dtype=bool).reshape(-1)
+        self.outside = ~self.support
+        self._capacity = 0
+        self._tmp = self._valid = None
+
+    def _allocate(self, k, algorithm="er"):
+        size, samples = self.support.size, self.freq_idx.size
+        # HIO and RAAR need two more image-sized buffers, ER does not
+        if algorithm != "er" and (self._tmp is None or len(self._tmp) < k):
+            self._tmp = np.empty((max(k, self._capacity), size), dtype=self.dtype)
+            self._valid = np.empty((max(k, self._capacity), size), dtype=bool)
+        if k <= self._capacity:
+            return
+        self.img = np.empty((k, size), dtype=self.dtype)
+        self.F = np.empty((k, size), dtype=self.cdtype)
+        self._values = np.empty((k, samples), dtype=self.cdtype)
+        self._mag = np.empty((k, samples), dtype=self.dtype)
+        self._diff = np.empty((k, samples), dtype=self.dtype)
+        self._zero = np.empty((k, samples), dtype=bool)
+        self._errors = np.empty(k, dtype=self.dtype)
+        self._capacity = k
+
+    def _fft(self, transform, k):
+        _fft_inplace(transform, self.F[:k].reshape((k,) + self.shape), self.workers)
+
+    def _start(self, starts, phases=None, rng=None, algorithm="er"):
+        # G = M * phase on the mask, zero elsewhere, back to image space; without
+        # given (centered, full-frame) phases, random ones are drawn for the
+        # masked frequencies only
+        k = starts if phases is None else len(phases)
+        self._allocate(k, algorithm)
+        values = self._values[:k]
+        if phases is None:
+            u = self._mag[:k]
+            np.random.default_rng(rng).random(out=u, dtype=self.dtype)
+            u *= 2 * np.pi
+            np.cos(u, out=values.real)
+            np.sin(u, out=values.imag)
+        else:
+            if self.centered:
+                phases = ifftshift(phases, axes=(-2, -1))
+            np.take(phases.reshape(k, -1), self.freq_idx, axis=1, out=values)
+        values *= self.M_vals
+        F = self.F[:k]
+        F[...] = 0
+        F[:, self.freq_idx] = values
+        self._fft(ifft2, k)
+        np.copyto(self.img[:k], F.real)
+        return k
+
+    def _apply_support(self, x):
+        np.copyto(x, 0, where=self.outside)
+        np.maximum(x, 0, out=x)
+
+    def _load(self, k, x):
+        F = self.F[:k]
+        F.real[...] = x
+        F.imag[...] = 0
+
+    def _fourier_error(self, k):
+        # transforms F[:k] and returns the Fourier-magnitude error of each row;
+        # the masked values and magnitudes stay in _values/_mag
+        values, mag, diff = self._values[:k], self._mag[:k], self._diff[:k]
+        self._fft(fft2, k)
+        np.take(self.F[:k], self.freq_idx, axis=1, out=values)
+        np.abs(values, out=mag)
+        np.subtract(mag, self.M_vals, out=diff)
+        errors = self._errors[:k]
+        np.einsum("ij,ij->i", diff, diff, out=errors)
+        np.sqrt(errors, out=errors)
+        errors /= self.M_norm
+        return errors
+
+    def _fourier_projection(self, k):
+        # F[:k] holds the iterates; leaves their projection (measured
+        # magnitudes, current phases) in F[:k].real and returns the
+        # Fourier-magnitude error of each iterate
+        F = self.F[:k]
+        values, mag, zero = self._values[:k], self._mag[:k], self._zero[:k]
+        errors = self._fourier_error(k)
+
+        # values * M / |values| is M * exp(i*angle(values)); angle(0) is 0
+        np.equal(mag, 0, out=zero)
+        np.copyto(mag, 1, where=zero)
+        np.divide(values, mag, out=values)
+        np.copyto(values, 1, where=zero)
+        values *= self.M_vals
+        F[:, self.freq_idx] = values
+
+        self._fft(ifft2, k)
+        return errors
+
+    def _iterate(self, k, algorithm="er", beta=0.9):
+        # one step on the first k starts; returns their errors
+        img, F = self.img[:k], self.F[:k]
+        if algorithm == "er":
+            self._apply_support(img)
+        self._load(k, img)
+        errors = self._fourier_projection(k)
+        p = F.real
+        if algorithm == "er":
+            np.copyto(img, p)
+            return errors
+
+        valid, tmp = self._valid[:k], self._tmp[:k]
+        if algorithm == "hio":
+            # in support and non-negative: take p, else x - beta * p
+            np.greater_equal(p, 0, out=valid)
+            valid &= self.support
+            np.multiply(p, beta, out=tmp)
+            img -= tmp
+        elif algorithm == "raar":
+            # in support and 2p - x >= 0: take p, else beta * x + (1 - 2 beta) * p
+            np.multiply(p, 2, out=tmp)
+            tmp -= img
+            np.greater_equal(tmp, 0, out=valid)
+            valid &= self.support
+            img *= beta
+            np.multiply(p, 1 - 2 * beta, out=tmp)
+            img += tmp
+        else:
+            raise ValueError(f"unknown algorithm {algorithm!r}, expected one of {ALGORITHMS}")
+        np.copyto(img, p, where=valid)
+
+        # the constrained estimate is kept in _tmp as the result
+        np.copyto(tmp, p)
+        self._apply_support(tmp)
+        self._load(k, tmp)
+        return self._fourier_error(k)
+
+    def _keep(self, rows):
+        # moves the given starts to the front of the buffers
+        k = len(rows)
+        self.img[:k] = self.img[rows]
+        if self._tmp is not None:
+            self._tmp[:k] = self._tmp[rows]
+
+    def _result(self, row, algorithm, out=None):
+        # ER returns its last Fourier projection as Numpy.py did; HIO and RAAR
+        # return their last constrained estimate. `out` (e.g. a memory-mapped
+        # .npy) receives the image instead of a new array.
+        image = (self.img[row] if algorithm == "er" else self._tmp[row]).reshape(self.shape)
+        if out is None:
+            return image.copy()
+        np.copyto(out, image)
+        return out
+
+    def run_batch(self, starts=8, iterations=500, phases=None, rng=None, tol=None, patience=10,
+                  keep=None, prune_after=None, algorithm="er", beta=0.9, out=None):
+        # K starts iterated together; with keep/prune_after, only the `keep`
+        # lowest-error starts go on after `prune_after` iterations. Stops early
+        # once no start has changed by more than tol (relative) for `patience`
+        # iterations. Returns (best image, its errors, final error per start,
+        # NaN for pruned starts).
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown algorithm {algorithm!r}, expected one of {ALGORITHMS}")
+        starts = self._start(starts, phases, rng, algorithm)
+        alive = np.arange(starts)
+        history = np.full((iterations, starts), np.nan)
+        stalled = 0
+        done = iterations
+        for it in range(iterations):
+            errors = self._iterate(len(alive), algorithm, beta)
+            history[it, alive] = errors
+            if keep and prune_after and it + 1 == prune_after and keep < len(alive):
+                order = np.argsort(errors)[:keep]
+                self._keep(order)
+                alive = alive[order]
+            if tol is not None and it:
+                previous = history[it - 1, alive]
+                change = np.abs(previous - history[it, alive])
+                stalled = stalled + 1 if np.all(change <= tol * previous) else 0
+                if stalled >= patience:
+                    done = it + 1
+                    break
+        final = history[done - 1]
+        row = int(np.argmin(final[alive]))
+        return self._result(row, algorithm, out), history[:done, alive[row]], final
+
+    def run(self, iterations=500, phase=None, rng=None, tol=None, patience=10, algorithm="er", beta=0.9,
+            out=None):
+        # a single start; returns (image, errors)
+        phases = None if phase is None else np.asarray(phase)[None]
+        image, errors, _ = self.run_batch(1, iterations, phases, rng, tol, patience,
+                                          algorithm=algorithm, beta=beta, out=out)
+        return image, errors
+
+
+def retrieve_phase(M, freq_mask, support_mask, algorithm="er", iterations=500, beta=0.9, workers=-1,
+                   tol=None, rng=None, dtype=np.float64):
+    engine = PhaseRetrieval(M, freq_mask, support_mask, workers=workers, dtype=dtype)
+    return engine.run(iterations, rng=rng, tol=tol, algorithm=algorithm, beta=beta)
+
+
+def retrieve_phase_files(M_path, freq_mask_path, support_path, image_path, errors_path=None, algorithm="er",
+                         iterations=500, beta=0.9, workers=-1, tol=None, rng=None, dtype=np.float32):
+    # .npy inputs are memory-mapped, and the reconstruction and error trace are
+    # written to memory-mapped .npy outputs
+    from numpy.lib.format import open_memmap
+    M = np.load(M_path, mmap_mode="r")
+    freq_mask = np.load(freq_mask_path, mmap_mode="r")
+    support_mask = np.load(support_path, mmap_mode="r")
+    engine = PhaseRetrieval(M, freq_mask, support_mask, workers=workers, dtype=dtype)
+    del M, freq_mask, support_mask
+    image = open_memmap(image_path, mode="w+", dtype=engine.dtype, shape=engine.shape)
+    _, errors = engine.run(iterations, rng=rng, tol=tol, algorithm=algorithm, beta=beta, out=image)
+    image.flush()
+    if errors_path:
+        trace = open_memmap(errors_path, mode="w+", dtype=np.float64, shape=errors.shape)
+        trace[:] = errors
+        trace.flush()
+    return image, errors
+
+
+def gerchberg_saxton(M, freq_mask, support_mask, iterations=500, workers=-1, tol=None, rng=None):
+    return retrieve_phase(M, freq_mask, support_mask, "er", iterations, workers=workers, tol=tol, rng=rng)
+
+
+def _run_starts(job):
+    M, freq_mask, support_mask, options, seed = job
+    engine = PhaseRetrieval(M, freq_mask, support_mask, workers=options.pop("workers"), dtype=options.pop("dtype"))
+    return engine.run_batch(rng=seed, **options)
+
+
+def multi_start(M, freq_mask, support_mask, starts=8, iterations=500, processes=1, rng=None, workers=None,
+                tol=None, patience=10, keep=None, prune_after=None, algorithm="er", beta=0.9,
+                dtype=np.float64):
+    # K random starts split over `processes` workers (each runs its share as
+    # one batch); returns the best (image, errors) by final Fourier-magnitude
+    # error and the final error of every start. Each process gets
+    # cpu_count // processes FFT threads unless workers is given, so the pool
+    # does not oversubscribe the CPUs. Pruning is opt-in: with keep="auto" and
+    # prune_after="auto" all starts run the first tenth of the iterations and
+    # the best quarter run the rest, so K starts cost about K/10 + K/4 full runs.
+    if keep == "auto":
+        keep = max(1, starts // 4)
+    if prune_after == "auto":
+        prune_after = max(1, iterations // 10)
+    processes = max(1, min(processes, starts))
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // processes)
+    seeds = np.random.SeedSequence(rng).spawn(processes)
+    shares = [len(part) for part in np.array_split(np.arange(starts), processes)]
+    jobs = [(M, freq_mask, support_mask,
+             dict(starts=share, iterations=iterations, tol=tol, patience=patience, workers=workers,
+                  keep=keep and max(1, keep * share // starts), prune_after=prune_after,
+                  algorithm=algorithm, beta=beta, dtype=dtype), seed)
+            for share, seed in zip(shares, seeds)]
+    if processes == 1:
+        results = [_run_starts(jobs[0])]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_run_starts, jobs))
+    finals = np.concatenate([final for _, _, final in results])
+    best = min(results, key=lambda result: np.nanmin(result[2]))
+    return best[0], best[1], finals
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Phase retrieval on memory-mapped .npy frames")
+    sub = parser.add_subparsers(dest="command", required=True)
+    phantom_parser = sub.add_parser("phantom", help="write a synthetic test frame")
+    phantom_parser.add_argument("directory")
+    phantom_parser.add_argument("--size", type=int, default=256)
+    phantom_parser.add_argument("--sampling-rate", type=float, default=0.6)
+    phantom_parser.add_argument("--noise-sigma", type=float, default=0.02)
+    phantom_parser.add_argument("--seed", type=int, default=0)
+    run_parser = sub.add_parser("run", help="reconstruct DIRECTORY/{M,freq_mask,support}.npy")
+    run_parser.add_argument("directory")
+    run_parser.add_argument("--algorithm", choices=ALGORITHMS, default="raar")
+    run_parser.add_argument("--iterations", type=int, default=200)
+    run_parser.add_argument("--beta", type=float, default=0.9)
+    run_parser.add_argument("--dtype", choices=["float32", "float64"], default="float32")
+    run_parser.add_argument("--workers", type=int, default=-1)
+    run_parser.add_argument("--tol", type=float)
+    run_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "phantom":
+        write_phantom(args.directory, args.size, args.sampling_rate, args.noise_sigma, args.seed)
+    else:
+        path = lambda name: os.path.join(args.directory, name)
+        _, errors = retrieve_phase_files(path("M.npy"), path("freq_mask.npy"), path("support.npy"),
+                                         path("reconstruction.npy"), path("errors.npy"), args.algorithm,
+                                         args.iterations, args.beta, args.workers, args.tol, args.seed, args.dtype)
+        print(json.dumps({"iterations": len(errors), "final_error": float(errors[-1])}))
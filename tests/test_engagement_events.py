@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engagement_events
+from engagement_events import engagement_score, generate_events, iter_events, write_events
+
+SMALL = dict(num_days=30, events_per_day=(2000, 4000), rng=1)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 3000, 5000, engagement_events.BLOCK_ROWS, 10 ** 9])
+def test_chunking_does_not_change_the_data(chunk_rows):
+    whole = generate_events(**SMALL)
+    if chunk_rows == 1:
+        # every row on its own would take a while; compare a stretch across a block edge
+        first = engagement_events.BLOCK_ROWS - 3
+        chunks = list(iter_events(**SMALL, chunk_rows=1))[first:first + 6]
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                      whole.iloc[first:first + 6].reset_index(drop=True))
+        return
+    chunked = pd.concat(iter_events(**SMALL, chunk_rows=chunk_rows), ignore_index=True)
+    pd.testing.assert_frame_equal(chunked, whole)
+
+
+def test_seed_is_reproducible_and_matters():
+    pd.testing.assert_frame_equal(generate_events(**SMALL), generate_events(**SMALL))
+    assert not generate_events(**dict(SMALL, rng=2))["user_id"].equals(generate_events(**SMALL)["user_id"])
+
+
+def test_columns_follow_the_event_type():
+    df = generate_events(rng=42)
+    assert df["platform"].dtype == engagement_events.PLATFORMS
+    assert df["event_type"].dtype == engagement_events.EVENTS
+    played = df["event_type"] == "play_video"
+    with_video = df["event_type"].isin(["play_video", "like", "comment"])
+    assert df["video_id"].notna().equals(with_video)
+    assert df["watch_time_sec"].notna().equals(played)
+    assert df["video_duration_sec"].notna().equals(played)
+    assert df["event_id"].tolist() == list(range(1, len(df) + 1))
+    days = df["timestamp"].dt.normalize().value_counts().sort_index().to_numpy()
+    assert (days == engagement_events.daily_counts(90, (50, 150), 42)).all()
+
+
+def test_engagement_score_sums_do_not_overflow():
+    event_type = pd.Series(pd.Categorical(["comment"] * 100_000, dtype=engagement_events.EVENTS))
+    assert engagement_score(event_type).sum() == 500_000
+    assert engagement_score(event_type).dtype == np.int64
+
+
+def test_write_events_matches_generate_events(tmp_path):
+    path = str(tmp_path / "events.parquet")
+    assert write_events(path, chunk_rows=7000, **SMALL) == len(generate_events(**SMALL))
+    pd.testing.assert_frame_equal(pd.read_parquet(path), generate_events(**SMALL))
+
+
+def test_write_events_with_no_rows_writes_the_schema(tmp_path):
+    path = str(tmp_path / "empty.parquet")
+    assert write_events(path, num_days=0) == 0
+    empty = pd.read_parquet(path)
+    assert len(empty) == 0
+    assert list(empty.columns) == list(generate_events(num_days=1, rng=0).columns)